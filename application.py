@@ -1,32 +1,82 @@
 import mode_classes
-from labjack import ljm
-from apscheduler.scheduler import Scheduler
-from random import randint
 import time
 import application_helper
+import stream_acquisition
+import trigger
+import run_logger
+import profiles
+import control_loop
+import engine as engine_module
+import snapshots
+import metrics
+import clocks
+import cooling_model
+import history
+import channels
+import event_log
+import supervisor
+
+# largest setpoint table worth building, in entries of 8 bytes
+MAX_SETPOINT_TABLE = 1000000
 
 class Application:
-    def __init__(self, controlMode = 0):
+    def __init__(self, controlMode = 0, backend = None, engine = None, serial = None, clock = None, stepped = False):
         # Initialize mode class
         self.modeClass = application_helper.modeToClass(controlMode)
         self.modeNumber = controlMode
 
-        # Initialize LabJack handle
-        self.handle = application_helper.openHandle()
-
-        # Initialize APScheduler Scheduler instance
-        self.sched = Scheduler()
-        self.sched.start()
+        # Initialize the clock run times are measured on, the real one unless a
+        # clocks.SimulatedClock is given
+        self.clock = clocks.systemClock if clock == None else clock
+
+        # Initialize LabJack handle, on the real LJM library unless a backend such as
+        # simulated_t7.SimulatedLJM() is given, for the device with this serial number
+        # or for any device
+        self.backend = backend
+        self.serial = serial
+        self.handle = application_helper.openHandle(backend, "ANY" if serial == None else serial)
+        self.deviceError = application_helper.errorFor(backend)
+        # False while the device is known to be unreachable; the supervisor, when started,
+        # reconnects it and sets this back
+        self.connected = not self.handle == None
+        self.supervisor = None
+
+        # Initialize the event loop engine shared with the GUI, or one of our own
+        self.ownsEngine = engine == None
+        if self.ownsEngine:
+            engine = engine_module.Engine()
+            engine.start()
+        self.engine = engine
+
+        # Initialize autosampler trigger watcher
+        self.trigger = trigger.TriggerWatcher(self.handle, self.engine)
+        self.trigger.setErrorHandler(self.deviceError, self.deviceLost)
+
+        # Initialize the control loop, ticking once a second until told otherwise; when
+        # stepped, it never runs by itself and each tick is made by calling step
+        self.loop = control_loop.ControlLoop(self.engine, 1.0)
+        self.subRates = [1, 1, 1]
+        self.stepped = stepped
 
         # Set/determine initial values
-        self.log = []
+        self.logger = None
+        self.logPolicy = [1.0, None]
+        self.logSuffix = "" if serial == None else "_" + str(serial)
         self.currentFlowRate = 1.0
-        self.startTime = time.time()
-        self.startTimeStruct = time.localtime()
+        self.startTime = self.clock.time()
+        self.startTimeStruct = self.clock.localtime()
         self.maxTime = 10
         self.pulse = [1, 500]
+        self.pulseActive = False
+        self.channelSet = None
+        self.flowDeadband = 0.0
+        self.streamSettings = None
         self.coolingTemperature = None
-        self.job = None
+        self.stream = None
+        self.snapshots = snapshots.LatestValue()
+        # the last hour of ticks at 1 Hz, with statistics over the last minute
+        self.history = history.History(3600, 60)
+        self.exporter = None
 
         if not self.handle == None:
             self.currentTemperatures = application_helper.getTemperature(self.handle)
@@ -39,6 +89,17 @@ class Application:
         self.coolOven = False
         self.repeat = False
         self.updateLog = False
+        self.runEndTime = None
+
+        # Initialize the oven cooling estimate; with a prepare lead, the next run is
+        # armed that many seconds before the oven is expected to be cool
+        self.coolingModel = cooling_model.CoolingModel()
+        self.timeToReady = None
+        self.prepareLead = 0.0
+        self.preparedEarly = False
+
+        # sequence.SequenceRunner choosing the next run, when one is running
+        self.sequence = None
 
         # Initialize scheduler updater job
         self.scheduleJob()
@@ -70,11 +131,24 @@ class Application:
     def setRepeat(self, repeat):
         self.repeat = repeat
 
+    def setPrepareLead(self, seconds):
+        # arms the next run this many seconds before the oven is predicted to have cooled,
+        # 0 arms it when the cooling temperature is reached
+        self.prepareLead = max(0.0, seconds)
+
+    def setCoolingPrior(self, tau, ambient):
+        # cooling time constant (s) and ambient temperature assumed until the cooling
+        # under way has been measured, for example from cooling_model.priorFromLogs
+        self.coolingModel.setPrior(tau, ambient)
+
 # Getters for class values
 
     def getModeNumber(self):
         return self.modeNumber
 
+    def getSerial(self):
+        return self.serial
+
     def getIsRunning(self):
         return self.isRunning
 
@@ -82,19 +156,53 @@ class Application:
         return self.currentFlowRate
 
     def getTimeElapsed(self):
-        return time.time() - self.startTime
+        return self.clock.time() - self.startTime
 
     def setMaxTime(self, maxTime):
         self.maxTime = maxTime
 
     def getTemperature(self, i):
-        if not self.handle == None:
-            if i in range(len(self.currentTemperatures)):
-                return self.currentTemperatures[i]
+        if not self.handle == None and self.connected:
+            if not self.stream == None:
+                # latest decimated value straight from the stream buffer
+                temperatures = self.stream.getTemperature()
+            else:
+                temperatures = self.currentTemperatures
+            if not temperatures == None and i in range(len(temperatures)):
+                return temperatures[i]
+
+    def getHistory(self):
+        # recent samples of time, flow and temperatures, see history.History
+        return self.history
+
+    def setHistorySize(self, capacity, window):
+        # samples kept, and samples the statistics cover; the history starts over
+        self.history = history.History(capacity, window)
+
+    def getRecentStats(self, name):
+        # min, max, mean and slope (per second) of "flow" or "temp0" to "temp3" over the window
+        return self.history.summary(name)
+
+    def getTimeToReady(self):
+        # predicted seconds until the oven reaches the cooling temperature, None when not cooling or unknown
+        return self.timeToReady
 
     def getTriggeredStart(self):
         return self.triggeredStart
 
+    def getSnapshot(self):
+        # latest state published by the control loop, safe to read from any thread
+        return self.snapshots.latest()
+
+    def getIsArmed(self):
+        return self.trigger.isArmed()
+
+    def getTriggerTime(self):
+        return self.trigger.triggerTime
+
+    def getTriggerLatency(self):
+        return self.trigger.latency
+
 # Setters for mode class
 
     def setArray(self, array):
@@ -106,6 +214,39 @@ class Application:
     def setFile(self, file):
         self.setArray(application_helper.fileToArray(file))
 
+    def setProfile(self, path):
+        # loads (or reuses) a text or binary profile, raises profiles.ProfileError on bad input
+        self.setArray(profiles.loadProfile(path))
+
+    def setBreakpoints(self, times, flows, interpolation = "step"):
+        # only meaningful in FlowVsTime mode
+        self.modeClass.setBreakpoints(times, flows, interpolation)
+
+    def setBreakpointProfile(self, path, interpolation = "step"):
+        times, flows = profiles.loadBreakpoints(path)
+        self.setBreakpoints(times, flows, interpolation)
+
+    def setChannels(self, channelSet):
+        # how the temperatures are read, a channels.ChannelSet; the channels the T7 can
+        # convert are set up on it now, so each tick reads finished temperatures
+        self.channelSet = channelSet
+        return self.deviceIO(application_helper.configureChannels, channelSet)
+
+    def setChannelFile(self, path):
+        # raises OSError or ValueError when the channel config cannot be used
+        return self.setChannels(channels.loadChannels(path))
+
+    def getChannels(self):
+        return application_helper.channelsFor(self.handle)
+
+    def setCalibrationFile(self, path):
+        # only meaningful in FlowVsTemp mode
+        self.modeClass.loadCalibration(path)
+
+    def setCalibration(self, curve):
+        # an already loaded calibration.CalibrationCurve, only meaningful in FlowVsTemp mode
+        self.modeClass.setCalibration(curve)
+
     def setFlowRate(self, flowRate):
         self.modeClass.setFlowRate(flowRate)
 
@@ -117,100 +258,271 @@ class Application:
 # Start and stop application
 
     def start(self, waitForTrigger = False, resetTime = True):
-        if not self.handle == None:
-            self.log = []
+        if self.handle == None:
+            event_log.warning("no LabJack connected, the run cannot start", serial = self.serial)
+        else:
             self.updateLog = waitForTrigger
             
             if resetTime:
                 self.resetTime()
+            # before arming, so the trigger starts the run without waiting for it
+            self.precomputeSetpoints()
                 
             if waitForTrigger:
-                self.waitForTrigger()
+                # the run begins from the trigger callback, the control loop keeps ticking meanwhile
+                self.trigger.arm(lambda triggerTime, latency: self.beginRun(True, resetTime))
+            else:
+                self.beginRun(False, resetTime)
 
-            self.isRunning = True
-            
-            if resetTime:
-                self.resetTime()
+    def beginRun(self, triggered, resetTime):
+        self.isRunning = True
+        
+        if resetTime:
+            self.resetTime()
 
-            self.triggeredStart = waitForTrigger
-            self.scheduleJob()
+        self.triggeredStart = triggered
+        if self.ovenIsCooling:
+            # triggered on a run armed ahead of time: the GC has started, so the oven
+            # must not be cooled any further
+            self.endCooling()
+        if not self.sequence == None:
+            self.sequence.runStarted()
+        if self.updateLog:
+            # the log file is named after the run's start time and filled as the run goes
+            self.closeLog()
+            self.logger = self.newLogger()
+        self.scheduleJob()
 
-            if self.modeNumber in [1,2] and self.triggeredStart:
-                self.start_pulse()
+        if self.modeNumber in [1,2] and self.triggeredStart:
+            self.start_pulse()
 
     def stopRun(self):
+        self.trigger.disarm()
         self.isRunning = False
         self.updateLog = False
         if self.triggeredStart:
-            application_helper.writeToTXT(self.startTimeStruct, self.log)
+            self.closeLog()
+
+    def newLogger(self):
+        return run_logger.RunLogger(self.startTimeStruct, self.engine, self.logPolicy[0], self.logPolicy[1], suffix = self.logSuffix)
+
+    def closeLog(self):
+        if not self.logger == None:
+            self.logger.close()
+            self.logger = None
+
+    def setLogPolicy(self, flushInterval, fsyncInterval = None):
+        # seconds between flushes of the run log, and between fsyncs (None never fsyncs)
+        self.logPolicy = [flushInterval, fsyncInterval]
 
     def stopAll(self):
         self.stopRun()
         self.unscheduleJob()
+        self.stopStream()
+
+    def shutdown(self):
+        # stops everything and releases the device and, if it is ours, the engine
+        self.stopSupervisor()
+        self.stopAll()
+        self.stopMetricsExport()
+        if self.ownsEngine:
+            self.engine.stop()
+        self.handle = application_helper.closeHandle(self.handle)
+
+# Stream acquisition
+
+    def startStream(self, scanRate = 1000, bufferSeconds = 60):
+        # samples AIN0-3 in hardware at scanRate, the control loop sees one averaged value per sensing tick
+        if not self.handle == None:
+            self.stopStream()
+            self.streamSettings = [scanRate, bufferSeconds]
+            self.stream = stream_acquisition.StreamAcquisition(self.handle, scanRate, self.loop.getRate()/self.subRates[0], bufferSeconds)
+            self.stream.errorHandler = self.deviceLost
+            self.stream.serial = self.serial
+            self.stream.start()
+
+    def stopStream(self):
+        self.streamSettings = None
+        if not self.stream == None:
+            self.stream.stop()
+            self.stream = None
+
+    def getStream(self):
+        return self.stream
 
     def waitForTrigger(self):
-        name = "FIO1"
-        while True:
-            result = ljm.eReadName(self.handle, name)
-            if result == 0:
-                break
+        # blocks until the autosampler trigger fires, sleeping between polls
+        begin = time.perf_counter()
+        self.trigger.arm()
+        self.trigger.wait()
+        metrics.observe("wait_for_trigger_seconds", time.perf_counter() - begin)
 
     def timeExceededAction(self):
-        print("time exceeded")
+        event_log.info("time exceeded", **self.eventFields())
         if not self.isRunning:
+            self.runEndTime = self.clock.time()
             self.currentFlowRate = 1.0
             self.sendFlowRate(1.0)
             if self.coolOven:
-                print("oven is cooling")
-                application_helper.setDigitalOutput(self.handle, 2, 1)
+                event_log.info("oven is cooling", **self.eventFields())
+                self.deviceIO(application_helper.setDigitalOutput, 2, 1)
                 self.ovenIsCooling = True
-            elif self.repeat:
-                print("repeating, oven not cooling in exceeded action")
-                self.start(waitForTrigger = True, resetTime = True)
+                self.preparedEarly = False
+                self.coolingModel.begin(self.clock.time(), self.getTemperature(3))
+            else:
+                self.runFinished()
+
+    def endCooling(self):
+        self.deviceIO(application_helper.setDigitalOutput, 2, 0)
+        self.ovenIsCooling = False
+        self.timeToReady = None
+        self.coolingModel.end()
+
+    def runFinished(self):
+        # the run is over and the oven has cooled: the sequence arms its next run, or
+        # the same method waits for the trigger again when repeating
+        if not self.sequence == None:
+            self.sequence.runFinished()
+        elif self.repeat:
+            event_log.info("restarting", **self.eventFields())
+            self.start(waitForTrigger = True, resetTime = True)
 
     def resetTime(self):
-        self.startTime = time.time()
-        self.startTimeStruct = time.localtime()
+        self.startTime = self.clock.time()
+        self.startTimeStruct = self.clock.localtime()
 
 # Schedule and unschedule jobs
 
     def scheduleJob(self):
         if not self.handle == None:
-            self.unscheduleJob()
-            self.job = self.sched.add_interval_job(func=self.updateAction, seconds=1)
-            self.updateAction()
+            if self.loop.isRunning():
+                self.loop.tickNow()
+            else:
+                self.loop.clearTasks()
+                if self.subRates == [1, 1, 1]:
+                    self.loop.addTask(self.updateAction)
+                else:
+                    self.loop.addTask(self.senseAction, self.subRates[0])
+                    self.loop.addTask(self.setpointAction, self.subRates[1])
+                    self.loop.addTask(self.outputAction, self.subRates[2])
+                if not self.stepped:
+                    self.loop.start()
 
     def unscheduleJob(self):
-        if not self.job == None:
-            self.sched.unschedule_job(self.job)
-            self.job = None
+        self.loop.stop()
+
+    def setControlRate(self, rate, senseEvery = 1, setpointEvery = 1, outputEvery = 1):
+        # ticks per second (1-100), and on which ticks temperatures are read, the
+        # setpoint is computed and the flow rate is written
+        running = self.loop.isRunning()
+        self.unscheduleJob()
+        self.loop.setRate(rate)
+        self.subRates = [senseEvery, setpointEvery, outputEvery]
+        if not self.stream == None:
+            # one averaged value per sensing tick, as startStream set it up
+            self.stream.setControlRate(self.loop.getRate()/self.subRates[0])
+        if self.isRunning or self.trigger.isArmed():
+            self.precomputeSetpoints()
+        if running or self.stepped:
+            self.scheduleJob()
+
+    def precomputeSetpoints(self):
+        # a flow vs time run looks its setpoints up in a table covering the GC runtime,
+        # one entry per setpoint tick, instead of evaluating the schedule every tick;
+        # the schedule is evaluated as before when the table would be too large
+        if not self.modeNumber == 1 or self.modeClass.schedule == None:
+            return
+        period = self.subRates[1]/self.loop.getRate()
+        if self.maxTime/period > MAX_SETPOINT_TABLE:
+            return
+        self.modeClass.precompute(period, self.maxTime)
+
+    def step(self):
+        # makes one control loop tick on the calling thread
+        self.loop.tick()
+
+    def getControlStats(self):
+        return self.loop.getStats()
 
 # Unified triggered update action
 
     def updateAction(self):
+        begin = time.perf_counter()
+        if self.isRunning and not self.modeClass.usesTemperature:
+            # the setpoint does not depend on this tick's temperatures, so the
+            # DAC0 write and the AIN reads share a single transaction
+            self.currentFlowRate = self.computeFlowRate()
+            self.exchangeWithDevice(self.currentFlowRate)
+        else:
+            self.updateTemperatures()
+            if self.isRunning:
+                self.currentFlowRate = self.computeFlowRate()
+                self.sendFlowRate(self.currentFlowRate)
+        self.checkProgress()
+        metrics.observe("update_action_seconds", time.perf_counter() - begin)
+
+# Update actions run at separate sub-rates
+
+    def senseAction(self):
         self.updateTemperatures()
+
+    def setpointAction(self):
+        if self.isRunning:
+            self.currentFlowRate = self.computeFlowRate()
+        self.checkProgress()
+
+    def outputAction(self):
         if self.isRunning:
-            self.currentFlowRate = self.modeClass.getFlowRate(self.getTimeElapsed(), self.getTemperature(0))
-            if self.updateLog:
-                self.log.append([self.getTimeElapsed()/60.0, self.currentFlowRate, self.currentTemperatures])
             self.sendFlowRate(self.currentFlowRate)
+
+# Separate triggered update actions
+
+    def computeFlowRate(self):
+        temperature = self.getTemperature(0)
+        if temperature == None and self.modeClass.usesTemperature:
+            # the oven temperature is unknown, so the flow rate stays as it is
+            return self.currentFlowRate
+        return self.modeClass.getFlowRate(self.getTimeElapsed(), temperature)
+
+    def checkProgress(self):
+        # logs the tick and handles the end of the run and oven cooling
+        if self.isRunning:
+            if self.updateLog and not self.logger == None:
+                self.logger.append([self.getTimeElapsed()/60.0, self.currentFlowRate, self.currentTemperatures])
             
             if self.timeExceeded():
                 self.stopRun()
                 self.timeExceededAction()
 
         if self.ovenIsCooling:
-            if self.getTemperature(3) < self.coolingTemperature:
-                application_helper.setDigitalOutput(self.handle, 2, 0)
-                self.ovenIsCooling = False
-                if self.repeat:
-                    print("restarting")
-                    self.start(waitForTrigger = True, resetTime = True)
-
-# Separate triggered update actions
+            temperature = self.getTemperature(3)
+            self.coolingModel.add(self.clock.time(), temperature)
+            self.timeToReady = self.coolingModel.timeToReach(self.coolingTemperature)
+            if temperature == None:
+                pass
+            elif temperature < self.coolingTemperature:
+                self.endCooling()
+                if not self.preparedEarly:
+                    self.runFinished()
+            elif not self.preparedEarly and not self.timeToReady == None and self.timeToReady <= self.prepareLead:
+                # the next run is loaded and armed while the oven finishes cooling
+                self.preparedEarly = True
+                self.runFinished()
+
+        self.history.append(self.clock.time(), self.currentFlowRate, self.currentTemperatures)
+        self.publishSnapshot()
+
+    def publishSnapshot(self):
+        temperatures = self.currentTemperatures
+        if not temperatures == None:
+            temperatures = tuple(temperatures)
+        self.snapshots.publish(snapshots.StateSnapshot(self.snapshots.nextSequence(), self.modeNumber,
+            self.isRunning, self.triggeredStart, self.trigger.isArmed(), self.ovenIsCooling,
+            self.currentFlowRate, temperatures, self.getTimeElapsed(), self.timeToReady, self.connected))
 
     def updateTemperatures(self):
-        self.currentTemperatures = application_helper.getTemperature(self.handle)
+        temperatures = self.deviceIO(application_helper.getTemperature)
+        self.currentTemperatures = [None]*4 if temperatures == None else temperatures
 
     def timeExceeded(self):
         return self.triggeredStart and self.getTimeElapsed() > self.maxTime
@@ -218,13 +530,146 @@ class Application:
 # Set flow rate on MFC
 
     def sendFlowRate(self, flowRate):
-        application_helper.eWriteName(self.handle, "DAC0", application_helper.flowRateToSignal(flowRate))
-        print("Flow rate set to", flowRate)
+        self.deviceIO(application_helper.eWriteName, "DAC0", application_helper.flowRateToSignal(flowRate))
+        metrics.count("flow_updates")
+        event_log.info("flow rate set", **self.eventFields(flowRate))
+
+    def exchangeWithDevice(self, flowRate):
+        # sends the flow rate and reads the temperatures in one round trip
+        temperatures = self.deviceIO(application_helper.setFlowAndGetTemperature, application_helper.flowRateToSignal(flowRate))
+        self.currentTemperatures = [None]*4 if temperatures == None else temperatures
+        metrics.count("flow_updates")
+        event_log.info("flow rate set", **self.eventFields(flowRate))
+
+    def eventFields(self, setpoint = None):
+        # the state every event log message from the application carries
+        return {"serial":self.serial, "tick":self.loop.ticks, "mode":self.modeNumber,
+                "setpoint":self.currentFlowRate if setpoint == None else setpoint,
+                "temperatures":self.currentTemperatures}
+
+# Device connection
+
+    def deviceIO(self, func, *args):
+        # func(handle, *args), or None while the device is unreachable; a failure is handed
+        # to the supervisor rather than raised into the control loop
+        handle = self.handle
+        if not self.connected:
+            return None
+        try:
+            return func(handle, *args)
+        except self.deviceError as error:
+            self.deviceLost(error, handle)
+            return None
+
+    def submit(self, func, *args):
+        # runs func(*args) on the device I/O executor for a caller on another thread, such
+        # as the GUI's, so it takes its turn with the control loop's ticks instead of
+        # racing them on the device; returns a concurrent.futures.Future
+        return self.engine.submit(self.callIO(func, *args))
+
+    async def callIO(self, func, *args):
+        try:
+            return await self.engine.io(func, *args)
+        except Exception:
+            event_log.exception("submitted call failed", **self.eventFields())
+
+    def deviceLost(self, error, handle):
+        # called from any thread, returns at once
+        metrics.count("device_errors")
+        if not self.supervisor == None:
+            self.supervisor.lost(error, handle)
+        else:
+            event_log.warning("LabJack I/O failed", serial = self.serial, error = str(error))
+
+    def restoreState(self, handle):
+        # brings a reopened device back to what the application last set, before the
+        # control loop uses it again: channels, flow rate, oven cooling and the pulse clock
+        if not self.channelSet == None:
+            application_helper.configureChannels(handle, self.channelSet)
+        application_helper.setDeadband(handle, "DAC0", self.flowDeadband)
+        names = ["DAC0", "FIO2"]
+        values = [application_helper.flowRateToSignal(self.currentFlowRate), 1 if self.ovenIsCooling else 0]
+        if self.pulseActive:
+            pulseNames, pulseValues = self.pulseRegisters()
+            names += pulseNames
+            values += pulseValues
+        application_helper.eWriteNames(handle, names, values)
+        self.handle = handle
+        self.trigger.handle = handle
+        self.currentTemperatures = application_helper.getTemperature(handle)
+        if not self.stream == None:
+            settings = self.streamSettings
+            try:
+                self.stopStream()
+            except self.deviceError:
+                # the old stream went with the old handle
+                self.stream = None
+            self.startStream(settings[0], settings[1])
+        if len(self.loop.tasks) == 0:
+            # the device was missing from the start, so the control loop never began
+            self.scheduleJob()
+
+    def startSupervisor(self, interval = 1.0, maxBackoff = 30.0):
+        # checks the connection in the background and reconnects a lost device
+        self.stopSupervisor()
+        self.supervisor = supervisor.ConnectionSupervisor(self, interval, maxBackoff = maxBackoff)
+        self.supervisor.start()
+
+    def stopSupervisor(self):
+        if not self.supervisor == None:
+            self.supervisor.stop()
+            self.supervisor = None
+
+    def isConnected(self):
+        return self.connected
+
+    def getConnectionStats(self):
+        if self.supervisor == None:
+            return {"connected":self.connected}
+        return self.supervisor.getStats()
+
+    def getRoundTripsSaved(self):
+        # of this device, since it was last opened
+        return application_helper.roundTripsSaved(self.handle)
+
+    def getShadowStats(self):
+        return application_helper.getShadowStats(self.handle)
+
+    def setFlowDeadband(self, deadband):
+        # smallest DAC0 change (in volts) that is worth sending to this device's MFC
+        self.flowDeadband = deadband
+        application_helper.setDeadband(self.handle, "DAC0", deadband)
+
+    def resync(self):
+        # discards the register shadow so every register is written again
+        application_helper.resyncShadow(self.handle)
+
+# Metrics
+
+    def startMetricsExport(self, path, interval = 10.0, format = "json"):
+        # writes the process's counters and latency histograms to path every interval seconds
+        self.stopMetricsExport()
+        self.exporter = metrics.Exporter(path, self.engine, interval, format)
+
+    def stopMetricsExport(self):
+        if not self.exporter == None:
+            self.exporter.stop()
+            self.exporter = None
+
+    def getMetrics(self):
+        return metrics.snapshot()
+
+    def setProfiling(self, every):
+        # profiles one control loop tick in every, 0 switches profiling off
+        metrics.setProfiling(every)
+
+    def dumpProfile(self, path):
+        return metrics.dumpProfile(path)
 
 # Pulsing
 
-    def start_pulse(self):
-        handle = self.handle
+    def pulseRegisters(self):
+        # the DIO0 PWM configuration for the pulse period and width, as register names and values
         period = self.pulse[0]
 
         #core clock frequency of T7-Pro 
@@ -242,15 +687,6 @@ class Application:
         #print ("Period = ", period, " s")
         #print ("Pulse Frequency = ", CORE_FREQ/(divisor*rollvalue), " Hz")
 
-        name = "DIO_EF_CLOCK0_ENABLE"
-        application_helper.eWriteName(handle,name,0)  # turn clock0 off 
-        name = "DIO_EF_CLOCK0_DIVISOR"
-        application_helper.eWriteName(handle,name,divisor)
-        name = "DIO_EF_CLOCK0_ROLL_VALUE"
-        application_helper.eWriteName(handle,name,rollvalue)
-        name = "DIO_EF_CLOCK0_ENABLE"
-        application_helper.eWriteName(handle,name,1)  # turn clock0 on 
-        
         # Enable the PWM mode 
         mode = 0
         
@@ -260,22 +696,28 @@ class Application:
         duty_cycle_div = period * 1000 / pulse_width
         
         highcount = int(rollvalue / duty_cycle_div)  #determine duty cycle for desired pulse width
-        
-        name = "DIO0_EF_ENABLE"
-        application_helper.eWriteName(handle,name,0)  #digital output off 
-        name = "DIO0_EF_TYPE"
-        application_helper.eWriteName(handle,name,mode)  # set PWM feature type 
-        name = "DIO0_EF_OPTIONS"
-        application_helper.eWriteName(handle,name,0)  # set CLOCK0 as clock source 
-        name = "DIO0_EF_VALUE_A"
-        application_helper.eWriteName(handle,name,highcount)  # set pulse width 
-        name = "DIO0_EF_ENABLE"
-        application_helper.eWriteName(handle,name,1)  #digital output on
+
+        # the whole configuration is sent in one transaction, written in order
+        names = ["DIO_EF_CLOCK0_ENABLE",     # turn clock0 off
+                 "DIO_EF_CLOCK0_DIVISOR",
+                 "DIO_EF_CLOCK0_ROLL_VALUE",
+                 "DIO_EF_CLOCK0_ENABLE",     # turn clock0 on
+                 "DIO0_EF_ENABLE",           # digital output off
+                 "DIO0_EF_TYPE",             # set PWM feature type
+                 "DIO0_EF_OPTIONS",          # set CLOCK0 as clock source
+                 "DIO0_EF_VALUE_A",          # set pulse width
+                 "DIO0_EF_ENABLE"]           # digital output on
+        values = [0, divisor, rollvalue, 1, 0, mode, 0, highcount, 1]
+        return names, values
+
+    def start_pulse(self):
+        begin = time.perf_counter()
+        names, values = self.pulseRegisters()
+        self.pulseActive = True
+        self.deviceIO(application_helper.eWriteNames, names, values)
+        metrics.observe("start_pulse_seconds", time.perf_counter() - begin)
 
     def stop_pulse(self):
-        handle = self.handle
-        # Disable the timer.  
-        name = "DIO0_EF_ENABLE"
-        application_helper.eWriteName(handle,name,0)  
-        # Set ouput low
-        application_helper.setDigitalOutput(handle, 0, 0)
+        self.pulseActive = False
+        # Disable the timer and set ouput low in one transaction
+        self.deviceIO(application_helper.eWriteNames, ["DIO0_EF_ENABLE", "FIO0"], [0, 0])
@@ -1,33 +1,146 @@
 import mode_classes
-from labjack import ljm
-import csv
-import datetime
+import metrics
+import channels
+import event_log
+import threading
 import time
 
 # LabJack operators
 
-def openHandle():
+# the labjack.ljm module, imported the first time a real device is used
+ljm = None
+
+def realLJM():
+    global ljm
+    if ljm == None:
+        from labjack import ljm as library
+        ljm = library
+    return ljm
+
+# device backend for each open handle, either the real LJM library or a simulator
+backends = {}
+
+def backendFor(handle):
+    backend = backends.get(handle)
+    if backend == None:
+        return realLJM()
+    return backend
+
+def errorFor(backend = None):
+    # the exception the backend raises for device errors
+    if backend == None:
+        backend = realLJM()
+    return backend.LJMError
+
+def listDevices(backend = None):
+    # serial numbers of every attached LabJack, each once even if it is reachable
+    # over more than one connection
+    if backend == None:
+        backend = realLJM()
     try:
-        # opens LabJack if there is one and returns handle
-        return ljm.open(ljm.constants.dtANY, ljm.constants.ctANY, "ANY")
-    except ljm.ljm.LJMError:
+        count, deviceTypes, connectionTypes, serials, addresses = backend.listAll(backend.constants.dtANY, backend.constants.ctANY)
+    except backend.LJMError:
+        return []
+    found = []
+    for serial in serials[:count]:
+        if not serial in found:
+            found.append(serial)
+    return found
+
+def openHandle(backend = None, identifier = "ANY"):
+    if backend == None:
+        backend = realLJM()
+    try:
+        # opens the LabJack with this serial number, or any LabJack, and returns handle
+        handle = backend.open(backend.constants.dtANY, backend.constants.ctANY, str(identifier))
+    except backend.LJMError:
         return None
+    backends[handle] = backend
+    # nothing is known about a freshly opened device
+    resyncShadow(handle)
+    channelSets[handle] = channels.ChannelSet()
+    return handle
 
 def closeHandle(handle):
     # closes handle if there is one
     if not handle == None:
-        ljm.close(handle)
+        shadows.pop(handle, None)
+        deadbands.pop(handle, None)
+        channelSets.pop(handle, None)
+        with statsLock:
+            ioStats.pop(handle, None)
+            shadowStats.pop(handle, None)
+        backendFor(handle).close(handle)
+        backends.pop(handle, None)
         return None
 
 def AINReader(handle, port):
     # simplified function for reading analog LabJack values
     return eReadName(handle, "AIN" + str(port))
 
+# stream acquisitions currently running, keyed by handle
+activeStreams = {}
+
+# nominal temperature and chart span of the thermocouple amplifier on each AIN channel
+temperatureSpans = channels.amplifierSpans
+
+# temperature channels of each open handle, see channels.ChannelSet
+channelSets = {}
+defaultChannels = channels.ChannelSet()
+
+def channelsFor(handle):
+    return channelSets.get(handle, defaultChannels)
+
+def configureChannels(handle, channelSet):
+    # sets up the channels the T7 converts itself, once; if it refuses, every channel
+    # is converted on the host instead. Returns True when the device converts any.
+    # An error from a device that no longer answers at all is raised
+    if handle == None:
+        return False
+    names, values = channelSet.setupRegisters()
+    if len(names) > 0:
+        try:
+            eWriteNames(handle, names, values)
+        except backendFor(handle).LJMError as error:
+            # the writes that did go out are no longer known
+            resyncShadow(handle)
+            # a register that is always there tells a refusal from a lost device
+            eReadName(handle, "SERIAL_NUMBER")
+            event_log.warning("AIN extended features unavailable, converting on the host", handle = handle, error = str(error))
+            channelSet = channelSet.onHost()
+    channelSets[handle] = channelSet
+    return channelSet.onDevice()
+
 def getTemperature(handle):
     # generates an array of temperatures
-    # dictionary of magic numbers to be used in computing temperatures
-    data = {0:[0, 1000], 1:[-200, 1000], 2:[0, 1000], 3:[0, 1000]}
-    return [readTemp(handle, port, data) for port in range(4)]
+    if handle in activeStreams:
+        # AIN channels are being streamed, so the latest decimated values are used
+        return activeStreams[handle].getTemperature()
+    # all four channels are read in one transaction
+    channelSet = channelsFor(handle)
+    values = eReadNames(handle, channelSet.readNames)
+    if values == None:
+        return [None for port in range(4)]
+    return channelSet.toTemperatures(values)
+
+def setFlowAndGetTemperature(handle, signal):
+    # writes the DAC0 signal and reads the four temperatures in one transaction
+    if handle in activeStreams:
+        eWriteName(handle, "DAC0", signal)
+        return activeStreams[handle].getTemperature()
+    channelSet = channelsFor(handle)
+    batch = IOBatch(handle)
+    batch.write("DAC0", signal)
+    for name in channelSet.readNames:
+        batch.read(name)
+    results = batch.execute()
+    if len(results) == 0:
+        return [None for port in range(4)]
+    return channelSet.toTemperatures([results[name] for name in channelSet.readNames])
+
+def voltagesToTemps(voltages, handle = None):
+    # temperatures from AIN voltages, with the host coefficients of handle's channels
+    return channelsFor(handle).voltagesToTemps(voltages)
 
 def setDigitalOutput(handle, channel, state):
     # simplified function for setting a digital out on the LabJack
@@ -38,14 +151,199 @@ def readTemp(handle, port, data):
     return voltageToTemp(AINReader(handle, port), data[port][0], data[port][1])
 
 def eWriteName(handle, name, value):
-    # wrties a value to the LabJack
+    # wrties a value to the LabJack, unless it already holds that value
     if not handle == None:
-        ljm.eWriteName(handle, name, value)
+        if isRedundantWrite(handle, name, value):
+            countShadow(handle, 1, 0)
+            return
+        countShadow(handle, 0, 1)
+        countTransaction(handle, 1)
+        begin = time.perf_counter()
+        backendFor(handle).eWriteName(handle, name, value)
+        metrics.observe("ljm_write_seconds", time.perf_counter() - begin)
+        recordWrite(handle, name, value)
 
 def eReadName(handle, name):
     # reads a value from the LabJack
     if not handle == None:
-        return ljm.eReadName(handle, name)
+        countTransaction(handle, 1)
+        begin = time.perf_counter()
+        value = backendFor(handle).eReadName(handle, name)
+        metrics.observe("ljm_read_seconds", time.perf_counter() - begin)
+        return value
+
+# Batched LabJack operators
+
+# running totals of register accesses (frames) and USB round trips (transactions), kept
+# per handle since it was opened
+ioStats = {}
+# guards the I/O and shadow counters, as a handle is used from its control loop, its
+# supervisor and the GUI
+statsLock = threading.Lock()
+
+def countTransaction(handle, frames):
+    with statsLock:
+        stats = ioStats.get(handle)
+        if stats == None:
+            stats = ioStats[handle] = {"frames":0, "transactions":0}
+        stats["frames"] += frames
+        stats["transactions"] += 1
+
+def getIOStats(handle):
+    with statsLock:
+        return dict(ioStats.get(handle, {"frames":0, "transactions":0}))
+
+def roundTripsSaved(handle):
+    # number of round trips avoided by sending several registers per transaction
+    stats = getIOStats(handle)
+    return stats["frames"] - stats["transactions"]
+
+def resetIOStats(handle):
+    with statsLock:
+        ioStats.pop(handle, None)
+
+def eWriteNames(handle, names, values):
+    # writes several values to the LabJack in one transaction, in order,
+    # leaving out the writes the shadow shows to be redundant
+    if not handle == None and len(names) > 0:
+        names, values = elideWrites(handle, names, values)
+        if len(names) > 0:
+            countTransaction(handle, len(names))
+            begin = time.perf_counter()
+            backendFor(handle).eWriteNames(handle, len(names), names, values)
+            metrics.observe("ljm_batch_seconds", time.perf_counter() - begin)
+            for name, value in zip(names, values):
+                recordWrite(handle, name, value)
+
+def eReadNames(handle, names):
+    # reads several values from the LabJack in one transaction
+    if not handle == None and len(names) > 0:
+        countTransaction(handle, len(names))
+        begin = time.perf_counter()
+        values = backendFor(handle).eReadNames(handle, len(names), names)
+        metrics.observe("ljm_batch_seconds", time.perf_counter() - begin)
+        return values
+
+class IOBatch:
+    # collects reads and writes so they reach the LabJack in a single eNames call
+    def __init__(self, handle):
+        self.handle = handle
+        self.backend = backendFor(handle)
+        self.names = []
+        self.writes = []
+        self.values = []
+
+    def read(self, name):
+        self.names.append(name)
+        self.writes.append(self.backend.constants.READ)
+        self.values.append(0)
+
+    def write(self, name, value):
+        if isRedundantWrite(self.handle, name, value):
+            countShadow(self.handle, 1, 0)
+            return
+        countShadow(self.handle, 0, 1)
+        self.names.append(name)
+        self.writes.append(self.backend.constants.WRITE)
+        self.values.append(value)
+
+    def execute(self):
+        # returns a dictionary of the values read, keyed by register name
+        names = self.names
+        writes = self.writes
+        self.names, self.writes, self.values, values = [], [], [], self.values
+        if self.handle == None or len(names) == 0:
+            return {}
+        countTransaction(self.handle, len(names))
+        begin = time.perf_counter()
+        results = self.backend.eNames(self.handle, len(names), names, writes, [1]*len(names), values)
+        metrics.observe("ljm_batch_seconds", time.perf_counter() - begin)
+        for i, name in enumerate(names):
+            if writes[i] == self.backend.constants.WRITE:
+                recordWrite(self.handle, name, values[i])
+        return {name:results[i] for i, name in enumerate(names) if writes[i] == self.backend.constants.READ}
+
+# Register shadow
+
+# last value written to each register name, kept per handle
+shadows = {}
+# how far an analog output may move before it is written again, per handle
+defaultDeadbands = {"DAC0":0.0}
+deadbands = {}
+# hits are writes skipped because the device already held the value, per handle
+shadowStats = {}
+
+def setDeadband(handle, name, deadband):
+    if not handle == None:
+        deadbands.setdefault(handle, dict(defaultDeadbands))[name] = deadband
+
+def resyncShadow(handle):
+    # forgets everything written to the handle, so the next writes all go out
+    if not handle == None:
+        shadows[handle] = {}
+
+def countShadow(handle, hits, misses):
+    with statsLock:
+        stats = shadowStats.get(handle)
+        if stats == None:
+            stats = shadowStats[handle] = {"hits":0, "misses":0}
+        stats["hits"] += hits
+        stats["misses"] += misses
+
+def getShadowStats(handle):
+    with statsLock:
+        return dict(shadowStats.get(handle, {"hits":0, "misses":0}))
+
+def resetShadowStats(handle):
+    with statsLock:
+        shadowStats.pop(handle, None)
+
+# registers whose value a write to another register stops being known, as the DIO0
+# extended feature drives the FIO0 line while it is enabled, and writing an AIN
+# extended feature index resets that channel's configuration; a name ending in *
+# stands for every register starting with the rest of it
+drivenBy = {"DIO0_EF_ENABLE":["FIO0"]}
+drivenBy.update({"AIN" + str(port) + "_EF_INDEX":["AIN" + str(port) + "_EF_CONFIG_*"] for port in range(14)})
+
+def applyWrite(shadow, name, value):
+    shadow[name] = value
+    for driven in drivenBy.get(name, []):
+        if driven.endswith("*"):
+            for register in [register for register in shadow if register.startswith(driven[:-1])]:
+                del shadow[register]
+        else:
+            shadow.pop(driven, None)
+
+def recordWrite(handle, name, value):
+    # called once the write has reached the device
+    applyWrite(shadows.setdefault(handle, {}), name, value)
+
+def isRedundantWrite(handle, name, value, shadow = None):
+    if shadow == None:
+        shadow = shadows.get(handle, {})
+    if not name in shadow:
+        return False
+    return abs(shadow[name] - value) <= deadbands.get(handle, defaultDeadbands).get(name, 0)
+
+def elideWrites(handle, names, values):
+    # returns the names and values that still need to be written
+    shadow = shadows.get(handle, {})
+    finalState = dict(zip(names, values))
+    if all(isRedundantWrite(handle, name, finalState[name], shadow) for name in finalState):
+        # the device already ends up in the state this sequence would leave it in
+        countShadow(handle, len(names), 0)
+        return [], []
+    # otherwise the sequence is kept in order, skipping only values already in place;
+    # the shadow itself is only updated once the writes have gone out
+    pending = dict(shadow)
+    keptNames, keptValues = [], []
+    for name, value in zip(names, values):
+        if not isRedundantWrite(handle, name, value, pending):
+            applyWrite(pending, name, value)
+            keptNames.append(name)
+            keptValues.append(value)
+    countShadow(handle, len(names) - len(keptNames), len(keptNames))
+    return keptNames, keptValues
 
 # LabJack helper methods
 
@@ -53,6 +351,10 @@ def voltageToTemp(voltage, tNom, chartSpan):
     # returns the temperature read by a thermocouple
     return ((chartSpan*voltage)+(10*tNom))/10
 
+def tempToVoltage(temp, tNom, chartSpan):
+    # returns the voltage a thermocouple amplifier gives for a temperature
+    return ((10*temp)-(10*tNom))/chartSpan
+
 def flowRateToSignal(flowRate):
     # returns the voltage to be sent for a particular flow rate
     if flowRate == None:
@@ -110,12 +412,20 @@ def string_default(string, default):
 
 # Writing log file
 
-def writeToTXT(startTime, array):
-    # creates log file using array of data
-    file = open((str(time.strftime("%Y-%m-%d_%H-%M-%S", startTime))+".txt."), "w")
-    [file.write(str(formatValue(entry[0], 2)) + "\t" + str(formatValue(entry[1], 2)) + "\t" + splitTemps(entry[2], 2) + "\n") for entry in array]
+def writeLog(path, array):
+    # writes a whole log at once, run logs are written as they go by run_logger.RunLogger
+    file = open(path, "w")
+    [file.write(formatLogEntry(entry)) for entry in array]
     file.close()
 
+def logFilename(startTime, suffix = ""):
+    # the suffix tells apart runs started in the same second on different devices
+    return str(time.strftime("%Y-%m-%d_%H-%M-%S", startTime))+suffix+".txt."
+
+def formatLogEntry(entry):
+    # one tab separated line of the log file
+    return str(formatValue(entry[0], 2)) + "\t" + str(formatValue(entry[1], 2)) + "\t" + splitTemps(entry[2], 2) + "\n"
+
 def splitTemps(temps, places):
     # uses array of temperatures to generate tabbed string for use in log file
     string = ""
@@ -0,0 +1,230 @@
+import application
+import application_helper
+import simulated_t7
+import multi_device
+import run_logger
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+# Control loop benchmarks, run against the simulated T7
+
+def percentile(values, fraction):
+    # nearest-rank percentile of an unsorted list
+    if len(values) == 0:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction*len(ordered)))]
+
+def summarize(values):
+    # returns p50/p99/max of a list of durations, in milliseconds
+    return {"p50_ms":percentile(values, 0.50)*1000,
+            "p99_ms":percentile(values, 0.99)*1000,
+            "max_ms":max(values)*1000,
+            "count":len(values)}
+
+def makeApplication(mode, latency, jitter, applicationClass = application.Application):
+    sim = simulated_t7.SimulatedLJM(latency=latency, jitter=jitter)
+    app = applicationClass(mode, backend=sim)
+    if mode == 1:
+        app.setArray([float(n % 20) for n in range(600)])
+        app.setTimeInterval(1)
+    app.setMaxTime(1e9)
+    return app, sim
+
+def benchmarkTicks(mode, ticks, latency, jitter):
+    # calls updateAction back to back and times each tick
+    app, sim = makeApplication(mode, latency, jitter)
+    app.start(waitForTrigger = False, resetTime = True)
+    # the ticks are driven from here, not by the control loop
+    app.unscheduleJob()
+    application_helper.resetIOStats(app.handle)
+    callsBefore = sim.callCount(app.handle)
+    durations = []
+    for n in range(ticks):
+        begin = time.perf_counter()
+        app.updateAction()
+        durations.append(time.perf_counter() - begin)
+    calls = sim.callCount(app.handle) - callsBefore
+    result = summarize(durations)
+    result["usb_calls_per_tick"] = calls/float(ticks)
+    result["frames_per_tick"] = application_helper.getIOStats(app.handle)["frames"]/float(ticks)
+    app.shutdown()
+    return result
+
+def benchmarkSchedule(mode, seconds, rate, latency, jitter):
+    # lets the application's own control loop drive the ticks and records when they fire
+    fireTimes = []
+    class TimedApplication(application.Application):
+        def updateAction(self):
+            fireTimes.append(time.monotonic())
+            application.Application.updateAction(self)
+    app, sim = makeApplication(mode, latency, jitter, TimedApplication)
+    app.setControlRate(rate)
+    app.start(waitForTrigger = False, resetTime = True)
+    time.sleep(seconds)
+    app.shutdown()
+    # the first entries are the ticks made while the run was being started
+    intervals = [fireTimes[n+1] - fireTimes[n] for n in range(1, len(fireTimes) - 1)]
+    if len(intervals) == 0:
+        return {"count":0}
+    period = app.loop.period
+    errors = [abs(interval - period) for interval in intervals]
+    result = summarize(errors)
+    result["drift_ms"] = ((fireTimes[-1] - fireTimes[1]) - period*len(intervals))*1000
+    result["loop"] = app.getControlStats()
+    return result
+
+def benchmarkDevices(count, seconds, rate, latency, jitter):
+    # the scheduling test with count simulated devices sharing one event loop
+    fireTimes = {}
+    class TimedApplication(application.Application):
+        def updateAction(self):
+            fireTimes.setdefault(self.serial, []).append(time.monotonic())
+            application.Application.updateAction(self)
+    sim = simulated_t7.SimulatedLJM(devices=count, latency=latency, jitter=jitter)
+    controller = multi_device.MultiDeviceController(1, sim, applicationClass=TimedApplication)
+    for app in controller.applications.values():
+        app.setArray([float(n % 20) for n in range(600)])
+        app.setTimeInterval(1)
+        app.setMaxTime(1e9)
+        app.setControlRate(rate)
+    controller.startAll()
+    time.sleep(seconds)
+    period = 1.0/rate
+    errors = []
+    for times in fireTimes.values():
+        # the first ticks are made while the application is built and the run is started
+        errors += [abs(times[n+1] - times[n] - period) for n in range(2, len(times) - 1)]
+    controller.shutdown()
+    if len(errors) == 0:
+        return {"count":0}
+    result = summarize(errors)
+    result["devices"] = len(fireTimes)
+    return result
+
+def benchmarkPulse(repeats, latency, jitter):
+    # start_pulse cost with a cold register shadow and with one that already holds the configuration
+    app, sim = makeApplication(1, latency, jitter)
+    cold = []
+    warm = []
+    for n in range(repeats):
+        app.resync()
+        begin = time.perf_counter()
+        app.start_pulse()
+        cold.append(time.perf_counter() - begin)
+        begin = time.perf_counter()
+        app.start_pulse()
+        warm.append(time.perf_counter() - begin)
+    app.shutdown()
+    return {"cold":summarize(cold), "shadowed":summarize(warm)}
+
+def benchmarkFinalize(sizes, latency, jitter):
+    # cost of logging runs of increasing length: time to queue the entries and the stall in stopRun
+    app, sim = makeApplication(1, latency, jitter)
+    results = []
+    directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        try:
+            for size in sizes:
+                temperatures = [180.0, -120.0, 210.0, 175.0]
+                app.resetTime()
+                # room for every entry, so the time to queue them is measured rather than drops
+                app.logger = run_logger.RunLogger(app.startTimeStruct, app.engine, maxPending = size)
+                app.triggeredStart = True
+                begin = time.perf_counter()
+                for n in range(size):
+                    app.logger.append([n/60.0, 10.0, temperatures])
+                appended = time.perf_counter() - begin
+                begin = time.perf_counter()
+                app.stopRun()
+                results.append({"entries":size, "seconds":time.perf_counter() - begin, "append_seconds":appended})
+                for name in os.listdir(scratch):
+                    os.remove(os.path.join(scratch, name))
+        finally:
+            os.chdir(directory)
+    app.triggeredStart = False
+    app.shutdown()
+    return results
+
+def gitRevision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def flatten(results, prefix = ""):
+    # turns nested results into {"tick.mode0.p99_ms": value} for comparisons
+    flat = {}
+    if isinstance(results, dict):
+        for key in results:
+            flat.update(flatten(results[key], prefix + str(key) + "."))
+    elif isinstance(results, list):
+        for entry in results:
+            if isinstance(entry, dict) and "entries" in entry:
+                flat[prefix + str(entry["entries"])] = entry["seconds"]
+    elif isinstance(results, (int, float)) and not isinstance(results, bool):
+        flat[prefix[:-1]] = results
+    return flat
+
+def compare(basePath, newPath, tolerance):
+    # prints metrics that got slower by more than tolerance, returns the number of regressions
+    base = flatten(json.load(open(basePath))["results"])
+    new = flatten(json.load(open(newPath))["results"])
+    regressions = 0
+    for key in sorted(set(base) & set(new)):
+        if key.endswith("count") or base[key] <= 0:
+            continue
+        ratio = new[key]/base[key]
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(key.ljust(45), "%12.4f %12.4f %7.2fx%s" % (base[key], new[key], ratio, flag))
+    return regressions
+
+def run(args):
+    sizes = [int(size) for size in args.log_sizes.split(",")]
+    results = {"tick":{}, "schedule":{}}
+    for mode in [0, 1, 2]:
+        results["tick"]["mode" + str(mode)] = benchmarkTicks(mode, args.ticks, args.latency, args.jitter)
+    if args.schedule_seconds > 0:
+        results["schedule"]["mode1"] = benchmarkSchedule(1, args.schedule_seconds, args.rate, args.latency, args.jitter)
+    if args.schedule_seconds > 0:
+        for count in [int(count) for count in args.devices.split(",")]:
+            results["schedule"]["devices" + str(count)] = benchmarkDevices(count, args.schedule_seconds, args.rate, args.latency, args.jitter)
+    results["start_pulse"] = benchmarkPulse(args.pulse_repeats, args.latency, args.jitter)
+    results["finalize"] = benchmarkFinalize(sizes, args.latency, args.jitter)
+    return {"revision":gitRevision(),
+            "python":platform.python_version(),
+            "time":time.strftime("%Y-%m-%d %H:%M:%S"),
+            "config":{"latency":args.latency, "jitter":args.jitter, "ticks":args.ticks, "rate":args.rate},
+            "results":results}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the control loop against a simulated T7")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--latency", type=float, default=0.001, help="simulated seconds per USB call")
+    parser.add_argument("--jitter", type=float, default=0.0002)
+    parser.add_argument("--ticks", type=int, default=500)
+    parser.add_argument("--schedule-seconds", type=float, default=10, help="0 skips the scheduler jitter test")
+    parser.add_argument("--rate", type=float, default=1.0, help="control loop rate for the jitter test, in Hz")
+    parser.add_argument("--devices", default="1,8", help="device counts for the multi-device jitter test")
+    parser.add_argument("--pulse-repeats", type=int, default=50)
+    parser.add_argument("--log-sizes", default="1000,10000,100000,1000000,10000000")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two result files instead of running")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    if args.compare:
+        raise SystemExit(1 if compare(args.compare[0], args.compare[1], args.tolerance) > 0 else 0)
+
+    output = run(args)
+    with open(args.output, "w") as file:
+        json.dump(output, file, indent=2)
+    print(json.dumps(output["results"], indent=2))
@@ -0,0 +1,170 @@
+import application_helper
+import array
+import bisect
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Binary columnar run log
+#
+# header: magic, version, column count, row count, start time (epoch seconds and the
+# nine struct_time fields) and the length of a JSON metadata block, followed by the
+# metadata padded to 8 bytes and then one little-endian float64 column after another
+
+MAGIC = b"GCXLOG\x00\x01"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQd9iI")
+COLUMNS = ["time", "flow", "temp0", "temp1", "temp2", "temp3"]
+
+def padding(length):
+    return (8 - length % 8) % 8
+
+def toFloat(value):
+    # missing values are stored as NaN
+    if value == None:
+        return float("nan")
+    return float(value)
+
+def fromFloat(value):
+    if math.isnan(value):
+        return None
+    return value
+
+def writeBinaryLog(path, startTime, entries, metadata = None):
+    # writes [time, flow, temperatures] entries as a binary columnar log
+    columns = [array.array('d') for name in COLUMNS]
+    for entry in entries:
+        columns[0].append(toFloat(entry[0]))
+        columns[1].append(toFloat(entry[1]))
+        for channel in range(4):
+            columns[2 + channel].append(toFloat(entry[2][channel]))
+    metadataBytes = json.dumps(metadata or {}).encode("utf-8")
+    rows = len(columns[0])
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(COLUMNS), rows, time.mktime(startTime), *tuple(startTime)[:9], len(metadataBytes)))
+        file.write(metadataBytes + b"\x00"*padding(HEADER.size + len(metadataBytes)))
+        for column in columns:
+            if sys.byteorder == "big":
+                column.byteswap()
+            column.tofile(file)
+
+class BinaryLog:
+    def __init__(self, path):
+        # memory-maps a binary log; columns are returned as views onto the mapping
+        self.path = path
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        fields = HEADER.unpack_from(self.map, 0)
+        if not fields[0] == MAGIC:
+            raise ValueError(path + " is not a binary run log")
+        if fields[1] > VERSION:
+            raise ValueError(path + " was written by a newer version (" + str(fields[1]) + ")")
+        self.columnCount = fields[2]
+        self.rows = fields[3]
+        self.startEpoch = fields[4]
+        self.startTimeStruct = time.struct_time(fields[5:14])
+        metadataLength = fields[14]
+        self.metadata = json.loads(bytes(self.map[HEADER.size:HEADER.size + metadataLength]).decode("utf-8"))
+        self.dataOffset = HEADER.size + metadataLength + padding(HEADER.size + metadataLength)
+        self.timeColumn = None
+
+    def __len__(self):
+        return self.rows
+
+    def column(self, name):
+        # NumPy view (or a memoryview of doubles without NumPy) of one column, no data is copied
+        offset = self.dataOffset + COLUMNS.index(name)*self.rows*8
+        if not numpy == None:
+            return numpy.frombuffer(self.map, dtype="<f8", count=self.rows, offset=offset)
+        if sys.byteorder == "big":
+            raise ValueError("zero-copy columns need NumPy on big-endian machines")
+        return memoryview(self.map)[offset:offset + self.rows*8].cast("d")
+
+    def columns(self):
+        return {name:self.column(name) for name in COLUMNS}
+
+    def timeRange(self, start, end):
+        # row indices [first, last) whose time (in minutes) lies in [start, end), by binary search
+        if self.timeColumn == None:
+            self.timeColumn = self.column("time")
+        if not numpy == None:
+            return int(numpy.searchsorted(self.timeColumn, start, "left")), int(numpy.searchsorted(self.timeColumn, end, "left"))
+        return bisect.bisect_left(self.timeColumn, start), bisect.bisect_left(self.timeColumn, end)
+
+    def select(self, start, end):
+        # views of every column restricted to a time range
+        first, last = self.timeRange(start, end)
+        return {name:self.column(name)[first:last] for name in COLUMNS}
+
+    def entries(self):
+        # yields entries in the [time, flow, temperatures] layout used by the text log
+        columns = [self.column(name) for name in COLUMNS]
+        for row in range(self.rows):
+            yield [fromFloat(float(columns[0][row])), fromFloat(float(columns[1][row])),
+                   [fromFloat(float(columns[2 + channel][row])) for channel in range(4)]]
+
+    def close(self):
+        # views handed out must be released before the mapping can be closed
+        self.timeColumn = None
+        self.map.close()
+        self.file.close()
+
+# Conversion to and from the text log
+
+def parseLogValue(string):
+    if string == "None":
+        return None
+    return float(string)
+
+def readTXT(path):
+    # reads a text log back into [time, flow, temperatures] entries
+    entries = []
+    with open(path) as file:
+        for line in file:
+            fields = line.rstrip("\n").split("\t")
+            entries.append([parseLogValue(fields[0]), parseLogValue(fields[1]), [parseLogValue(field) for field in fields[2:6]]])
+    return entries
+
+def startTimeFromFilename(path):
+    # text logs are named after the start of the run
+    name = os.path.basename(path).split(".")[0]
+    try:
+        return time.strptime(name, "%Y-%m-%d_%H-%M-%S")
+    except ValueError:
+        return time.localtime(os.path.getmtime(path))
+
+def txtToBinary(txtPath, binaryPath, metadata = None):
+    startTime = startTimeFromFilename(txtPath)
+    writeBinaryLog(binaryPath, startTime, readTXT(txtPath), metadata)
+
+def binaryToTXT(binaryPath, txtPath = None):
+    # writes the text log, named after the run's start time unless a path is given
+    log = BinaryLog(binaryPath)
+    try:
+        if txtPath == None:
+            txtPath = application_helper.logFilename(log.startTimeStruct)
+        with open(txtPath, "w") as file:
+            for entry in log.entries():
+                file.write(application_helper.formatLogEntry(entry))
+    finally:
+        log.close()
+    return txtPath
+
+if __name__ == "__main__":
+    # python binary_log.py <input> <output>, the direction is chosen by the input's magic number
+    source, destination = sys.argv[1], sys.argv[2]
+    with open(source, "rb") as file:
+        isBinary = file.read(len(MAGIC)) == MAGIC
+    if isBinary:
+        binaryToTXT(source, destination)
+    else:
+        txtToBinary(source, destination)
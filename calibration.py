@@ -0,0 +1,120 @@
+import array
+
+# Temperature to flow calibration curves for FlowVsTemp
+
+def loadNumpy():
+    # NumPy is optional and only imported when a fit or an array evaluation needs it
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+class CalibrationCurve:
+    def __init__(self, coefficients, offset = 0.0, cutoff = 60.0, belowCutoff = 15.0, maxTemp = 450.0, step = 0.1):
+        # flow = polynomial(temp) + offset above cutoff (coefficients highest power first),
+        # belowCutoff at or under it; the polynomial is compiled into a lookup table
+        # from cutoff to maxTemp with step degree spacing
+        self.coefficients = list(coefficients)
+        self.offset = offset
+        self.cutoff = cutoff
+        self.belowCutoff = belowCutoff
+        self.maxTemp = maxTemp
+        self.step = step
+        self.compile()
+
+    def polynomial(self, temp):
+        # Horner evaluation of the fitted polynomial plus the offset
+        flow = 0.0
+        for coefficient in self.coefficients:
+            flow = flow*temp + coefficient
+        return flow + self.offset
+
+    def compile(self):
+        size = int((self.maxTemp - self.cutoff)/self.step) + 2
+        self.table = array.array('d', [self.polynomial(self.cutoff + n*self.step) for n in range(size)])
+        self.inverseStep = 1.0/self.step
+        self.lastIndex = size - 2
+
+    def tempToFlow(self, temp):
+        if temp > self.cutoff:
+            position = (temp - self.cutoff)*self.inverseStep
+            n = int(position)
+            if n > self.lastIndex:
+                # above the table, the polynomial itself is used
+                return self.polynomial(temp)
+            low = self.table[n]
+            return low + (self.table[n+1] - low)*(position - n)
+        else:
+            # otherwise, an arbitrary maximum value is returned
+            return self.belowCutoff
+
+    def tempToFlowArray(self, temps):
+        # evaluates many temperatures at once, for offline work on logged runs
+        numpy = loadNumpy()
+        if numpy == None:
+            return [self.tempToFlow(temp) for temp in temps]
+        temps = numpy.asarray(temps, dtype=float)
+        grid = self.cutoff + numpy.arange(len(self.table))*self.step
+        flows = numpy.interp(temps, grid, numpy.frombuffer(self.table, dtype=float))
+        above = temps > grid[-1]
+        if above.any():
+            flows[above] = numpy.polyval(self.coefficients, temps[above]) + self.offset
+        flows[temps <= self.cutoff] = self.belowCutoff
+        return flows
+
+def defaultCurve(offset = 0.5):
+    # the cubic FlowVsTemp has always used
+    return CalibrationCurve([-4.366E-7, 4.625E-4, -0.1678, 22.69], offset, 60.0, 15.0)
+
+def fitPolynomial(temps, flows, degree):
+    # least squares fit, coefficients highest power first
+    if len(temps) <= degree:
+        raise ValueError("a degree " + str(degree) + " fit needs more than " + str(degree) + " points")
+    numpy = loadNumpy()
+    if not numpy == None:
+        return list(numpy.polyfit(temps, flows, degree))
+    # normal equations solved by Gaussian elimination with partial pivoting
+    size = degree + 1
+    sums = [sum(temp**power for temp in temps) for power in range(2*degree + 1)]
+    matrix = [[sums[row + column] for column in range(size)] + [sum(flow*temp**row for temp, flow in zip(temps, flows))] for row in range(size)]
+    for column in range(size):
+        pivot = max(range(column, size), key=lambda row: abs(matrix[row][column]))
+        matrix[column], matrix[pivot] = matrix[pivot], matrix[column]
+        for row in range(column + 1, size):
+            factor = matrix[row][column]/matrix[column][column]
+            for n in range(column, size + 1):
+                matrix[row][n] -= factor*matrix[column][n]
+    solution = [0.0]*size
+    for row in reversed(range(size)):
+        solution[row] = (matrix[row][size] - sum(matrix[row][n]*solution[n] for n in range(row + 1, size)))/matrix[row][row]
+    # solution is lowest power first
+    return list(reversed(solution))
+
+def loadCalibration(path):
+    # reads "temperature flow" points, one per line, and fits them once;
+    # comment lines may set options, for example "# degree = 2" or "# cutoff = 80"
+    options = {"degree":3, "offset":0.0, "cutoff":60.0, "below":15.0, "max":450.0, "step":0.1}
+    temps = []
+    flows = []
+    lineNumber = 0
+    with open(path) as file:
+        for line in file:
+            lineNumber += 1
+            line = line.strip()
+            if line.startswith("#"):
+                if "=" in line:
+                    key, value = line[1:].split("=", 1)
+                    if key.strip() in options:
+                        options[key.strip()] = float(value)
+                continue
+            if len(line) == 0:
+                continue
+            fields = line.split()
+            try:
+                temps.append(float(fields[0]))
+                flows.append(float(fields[1]))
+            except (ValueError, IndexError):
+                raise ValueError(path + ", line " + str(lineNumber) + ": expected a temperature and a flow rate")
+    coefficients = fitPolynomial(temps, flows, int(options["degree"]))
+    return CalibrationCurve(coefficients, options["offset"], options["cutoff"], options["below"], options["max"], options["step"])
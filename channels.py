@@ -0,0 +1,146 @@
+import configparser
+
+# Temperature channels: how each AIN channel's reading becomes a temperature, either on
+# the T7 through the AIN extended features (AINx_EF) or on the host from the voltage
+#
+#   [AIN0]
+#   kind = amplifier             ; amplifier, linear or thermocouple
+#   t_nom = 0                    ; amplifier nominal temperature (°C)
+#   chart_span = 1000            ; amplifier chart span (°C)
+#   slope = 100                  ; linear: °C per volt
+#   offset = 0                   ; linear: °C at 0 V
+#   type = K                     ; thermocouple type
+#   device = yes                 ; convert on the T7, falls back to the host if it refuses
+
+# nominal temperature and chart span of the thermocouple amplifier on each AIN channel
+amplifierSpans = {0:[0, 1000], 1:[-200, 1000], 2:[0, 1000], 3:[0, 1000]}
+
+# AINx_EF_INDEX of each thermocouple type
+thermocoupleIndexes = {"E":20, "J":21, "K":22, "R":23, "T":24, "S":25, "N":27, "B":28, "C":30}
+
+# rough sensitivity near room temperature (V per °C) of the types with a usable one, for
+# converting on the host; the other types need the slope given
+seebeck = {"E":61e-6, "J":52e-6, "K":41e-6, "T":41e-6, "N":27e-6}
+
+# the T7's internal temperature sensor (TEMPERATURE_DEVICE_K) as cold junction
+CJC_ADDRESS = 60052
+# AINx_EF_CONFIG_A temperature units: 0 K, 1 °C, 2 °F
+CELSIUS = 1
+# input range (V) of a thermocouple channel, the T7's most sensitive one
+THERMOCOUPLE_RANGE = 0.1
+
+class Channel:
+    def __init__(self, port, kind = "linear", slope = 1.0, offset = 0.0, thermocouple = None, onDevice = False):
+        # on the host, temperature = slope*voltage + offset; a thermocouple channel's
+        # slope and offset only serve when the T7 cannot convert it, and are rough
+        if not kind in ("linear", "thermocouple"):
+            raise ValueError("AIN" + str(port) + ": unknown channel kind " + repr(kind))
+        if kind == "thermocouple" and not thermocouple in thermocoupleIndexes:
+            raise ValueError("AIN" + str(port) + ": unknown thermocouple type " + repr(thermocouple))
+        self.port = port
+        self.kind = kind
+        self.slope = slope
+        self.offset = offset
+        self.thermocouple = thermocouple
+        self.onDevice = onDevice
+
+    def readName(self):
+        if self.onDevice:
+            return "AIN" + str(self.port) + "_EF_READ_A"
+        return "AIN" + str(self.port)
+
+    def setupRegisters(self):
+        # register names and values that set up the T7 to convert this channel
+        prefix = "AIN" + str(self.port)
+        if self.kind == "linear":
+            # EF index 1: READ_A = CONFIG_D*volts + CONFIG_E
+            return [[prefix + "_EF_INDEX", 1], [prefix + "_EF_CONFIG_D", self.slope], [prefix + "_EF_CONFIG_E", self.offset]]
+        return [[prefix + "_EF_INDEX", thermocoupleIndexes[self.thermocouple]], [prefix + "_RANGE", THERMOCOUPLE_RANGE],
+                [prefix + "_EF_CONFIG_A", CELSIUS], [prefix + "_EF_CONFIG_B", CJC_ADDRESS],
+                [prefix + "_EF_CONFIG_D", 1.0], [prefix + "_EF_CONFIG_E", 0.0]]
+
+def amplifierChannel(port, tNom, chartSpan, onDevice = False):
+    # the amplifier's output, temperature = (chartSpan*voltage + 10*tNom)/10, is linear
+    return Channel(port, "linear", chartSpan/10.0, float(tNom), onDevice = onDevice)
+
+def thermocoupleChannel(port, thermocouple, onDevice = True, slope = None, offset = 25.0):
+    # offset is the cold junction temperature assumed on the host
+    if slope == None:
+        if not thermocouple in seebeck:
+            raise ValueError("AIN" + str(port) + ": type " + str(thermocouple) + " thermocouples need a slope to convert on the host")
+        slope = 1.0/seebeck[thermocouple]
+    return Channel(port, "thermocouple", slope, offset, thermocouple, onDevice)
+
+def defaultChannels():
+    return [amplifierChannel(port, amplifierSpans[port][0], amplifierSpans[port][1]) for port in sorted(amplifierSpans)]
+
+class ChannelSet:
+    def __init__(self, channels = None):
+        # the channels read for the four temperatures, in order
+        self.channels = defaultChannels() if channels == None else list(channels)
+        self.compile()
+
+    def compile(self):
+        # what each reading needs is worked out once, not per sample
+        self.readNames = [channel.readName() for channel in self.channels]
+        self.slopes = [channel.slope for channel in self.channels]
+        self.offsets = [channel.offset for channel in self.channels]
+        self.converted = [channel.onDevice for channel in self.channels]
+
+    def setupRegisters(self):
+        # names and values of every register to write once at connect time
+        names = []
+        values = []
+        for channel in self.channels:
+            if channel.onDevice:
+                for name, value in channel.setupRegisters():
+                    names.append(name)
+                    values.append(value)
+        return names, values
+
+    def onDevice(self):
+        return any(self.converted)
+
+    def onHost(self):
+        # a copy converting every channel on the host, for a device that cannot convert;
+        # this set is left as it is, so another device may still convert its channels
+        return ChannelSet([Channel(channel.port, channel.kind, channel.slope, channel.offset, channel.thermocouple, False)
+                           for channel in self.channels])
+
+    def toTemperatures(self, values):
+        # values read from readNames, in the same order
+        return [value if converted else slope*value + offset
+                for value, converted, slope, offset in zip(values, self.converted, self.slopes, self.offsets)]
+
+    def voltagesToTemps(self, voltages):
+        # voltages of every channel converted on the host, as streamed AIN values are
+        return [slope*voltage + offset for voltage, slope, offset in zip(voltages, self.slopes, self.offsets)]
+
+def loadChannels(path):
+    # a ChannelSet from a channel config file, channels it leaves out keep the amplifier
+    # defaults; raises OSError when it cannot be read and ValueError when it is wrong
+    parser = configparser.ConfigParser(inline_comment_prefixes = (";", "#"))
+    with open(path) as file:
+        try:
+            parser.read_file(file)
+        except configparser.Error as error:
+            raise ValueError(path + ": " + str(error))
+    channels = defaultChannels()
+    for section in parser.sections():
+        if not section.upper().startswith("AIN") or not section[3:].isdigit() or not int(section[3:]) in amplifierSpans:
+            raise ValueError(path + ": unknown channel [" + section + "], expected AIN0 to AIN3")
+        port = int(section[3:])
+        values = parser[section]
+        kind = values.get("kind", "amplifier").strip().lower()
+        onDevice = values.getboolean("device", kind == "thermocouple")
+        if kind == "amplifier":
+            channels[port] = amplifierChannel(port, values.getfloat("t_nom", amplifierSpans[port][0]),
+                                              values.getfloat("chart_span", amplifierSpans[port][1]), onDevice)
+        elif kind == "linear":
+            channels[port] = Channel(port, "linear", values.getfloat("slope", 1.0), values.getfloat("offset", 0.0), onDevice = onDevice)
+        elif kind == "thermocouple":
+            channels[port] = thermocoupleChannel(port, values.get("type", "K").strip().upper(), onDevice,
+                                                 values.getfloat("slope", None), values.getfloat("offset", 25.0))
+        else:
+            raise ValueError(path + ": [" + section + "] has unknown kind " + repr(kind) + ", expected amplifier, linear or thermocouple")
+    return ChannelSet(channels)
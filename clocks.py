@@ -0,0 +1,47 @@
+import threading
+import time
+
+# Clocks for run timing; the application and the simulator take one, so a method can
+# run against simulated time as well as real time
+
+class SystemClock:
+    # the real time
+    def time(self):
+        return time.time()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def localtime(self, seconds = None):
+        return time.localtime(seconds)
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+class SimulatedClock:
+    def __init__(self, start = None):
+        # only moves when advanced, or when something sleeps on it; starts at the
+        # current time unless another epoch time is given
+        self.lock = threading.Lock()
+        self.start = time.time() if start == None else start
+        self.now = self.start
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now - self.start
+
+    def localtime(self, seconds = None):
+        return time.localtime(self.now if seconds == None else seconds)
+
+    def sleep(self, seconds):
+        # returns at once, the time having moved on
+        self.advance(seconds)
+
+    def advance(self, seconds):
+        if seconds > 0:
+            with self.lock:
+                self.now += seconds
+
+systemClock = SystemClock()
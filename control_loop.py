@@ -0,0 +1,136 @@
+import asyncio
+import time
+import event_log
+import metrics
+
+class ControlLoop:
+    def __init__(self, engine, rate = 1.0, minRate = 1.0, maxRate = 100.0, inline = False):
+        # runs tasks at a fixed rate against absolute monotonic deadlines, as a coroutine
+        # on an engine.Engine; the tasks run on the device I/O executor, or on the loop
+        # thread itself when inline is set
+        self.minRate = minRate
+        self.maxRate = maxRate
+        self.setRate(rate)
+        self.tasks = []
+        self.engine = engine
+        self.inline = inline
+        self.future = None
+        self.running = False
+        self.asyncWakeEvent = None
+        self.restartPhase = False
+        self.resetStats()
+
+    def setRate(self, rate):
+        # ticks per second, kept within minRate and maxRate
+        self.rate = min(self.maxRate, max(self.minRate, rate))
+        self.period = 1.0/self.rate
+
+    def getRate(self):
+        return self.rate
+
+    def addTask(self, func, every = 1):
+        # func runs on every nth tick, so tasks can run at sub-rates of the loop
+        self.tasks.append([func, max(1, int(every))])
+
+    def clearTasks(self):
+        self.tasks = []
+
+    def resetStats(self):
+        self.ticks = 0
+        self.overruns = 0
+        self.skippedTicks = 0
+        self.errors = 0
+        self.lastDuration = 0.0
+        self.maxDuration = 0.0
+        self.lastLateness = 0.0
+
+    def getStats(self):
+        return {"rate":self.rate, "ticks":self.ticks, "overruns":self.overruns, "skippedTicks":self.skippedTicks,
+                "errors":self.errors, "lastDuration":self.lastDuration, "maxDuration":self.maxDuration,
+                "lastLateness":self.lastLateness}
+
+# Start and stop
+
+    def start(self):
+        if self.isRunning():
+            return
+        self.running = True
+        self.future = self.engine.submit(self.runAsync())
+
+    def stop(self):
+        # lets the current tick finish, then waits for the loop to end
+        self.running = False
+        self.wake()
+        self.engine.wait(self.future)
+        self.future = None
+
+    def isRunning(self):
+        return not self.future == None and self.running
+
+    def tickNow(self):
+        # the next tick happens immediately and later ticks are timed from it
+        self.restartPhase = True
+        self.wake()
+
+    def wake(self):
+        if not self.asyncWakeEvent == None:
+            self.engine.call(self.asyncWakeEvent.set)
+
+# Loop
+
+    async def runAsync(self):
+        self.asyncWakeEvent = asyncio.Event()
+        deadline = time.monotonic()
+        try:
+            while self.running:
+                now = time.monotonic()
+                if self.restartPhase:
+                    self.restartPhase = False
+                    deadline = now
+                self.lastLateness = now - deadline
+                if self.inline:
+                    self.tick()
+                else:
+                    await self.engine.io(self.tick)
+
+                # deadlines advance by whole periods, so timing errors do not accumulate
+                deadline += self.period
+                now = time.monotonic()
+                if now > deadline:
+                    # the tick ran past the next deadline: skip the ticks that were missed
+                    # instead of running them back to back
+                    self.overruns += 1
+                    missed = int((now - deadline)/self.period) + 1
+                    self.skippedTicks += missed
+                    metrics.count("tick_overruns")
+                    deadline += missed*self.period
+                try:
+                    await asyncio.wait_for(self.asyncWakeEvent.wait(), deadline - now)
+                except asyncio.TimeoutError:
+                    pass
+                self.asyncWakeEvent.clear()
+        finally:
+            self.asyncWakeEvent = None
+
+    def tick(self):
+        begin = time.monotonic()
+        if metrics.shouldProfile(self.ticks):
+            # a sample of the ticks runs under cProfile when profiling is switched on
+            metrics.profileCall(self.runTasks)
+        else:
+            self.runTasks()
+        self.ticks += 1
+        self.lastDuration = time.monotonic() - begin
+        self.maxDuration = max(self.maxDuration, self.lastDuration)
+        metrics.observe("tick_seconds", self.lastDuration)
+
+    def runTasks(self):
+        for func, every in self.tasks:
+            if self.ticks % every == 0:
+                try:
+                    func()
+                except Exception:
+                    # a failing task must not stop the loop
+                    self.errors += 1
+                    metrics.count("tick_errors")
+                    event_log.exception("control loop task failed", tick = self.ticks, task = getattr(func, "__name__", repr(func)))
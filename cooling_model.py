@@ -0,0 +1,151 @@
+import math
+import sys
+
+# Oven cooling estimate: an exponential decay towards ambient,
+#   T(t) = ambient + (T0 - ambient)*exp(-t/tau)
+# fitted as the temperature samples arrive, from which the time left until the oven
+# reaches the cooling temperature follows
+
+class CoolingModel:
+    def __init__(self, tau = None, ambient = None, spacing = 2.0, minPairs = 3):
+        # tau and ambient, when known from earlier cooling, are used until the current
+        # cooling has minPairs sample pairs at least spacing seconds apart
+        self.priorTau = tau
+        self.priorAmbient = ambient
+        self.spacing = spacing
+        self.minPairs = minPairs
+        self.reset()
+
+    def reset(self):
+        self.last = None
+        self.current = None
+        self.steepest = 0.0
+        self.clearSums()
+
+    def clearSums(self):
+        # running sums of the regression of the cooling rate against the temperature,
+        # dT/dt = -(T - ambient)/tau, so every sample costs the same
+        self.n = 0
+        self.sumX = 0.0
+        self.sumY = 0.0
+        self.sumXX = 0.0
+        self.sumXY = 0.0
+
+    def begin(self, t, temp):
+        self.reset()
+        self.add(t, temp)
+
+    def add(self, t, temp):
+        if temp == None:
+            return
+        self.current = (t, temp)
+        if self.last == None:
+            self.last = (t, temp)
+            return
+        dt = t - self.last[0]
+        if dt < self.spacing:
+            # closer samples would mostly add noise to the rate
+            return
+        x = (temp + self.last[1])/2
+        y = (temp - self.last[1])/dt
+        if -y > self.steepest:
+            # the oven is still speeding up its cooling, as the second oven lags the oven
+            # and cooling takes a while to act; the decay is fitted from the steepest point on
+            self.steepest = -y
+            self.clearSums()
+        self.n += 1
+        self.sumX += x
+        self.sumY += y
+        self.sumXX += x*x
+        self.sumXY += x*y
+        self.last = (t, temp)
+
+    def currentFit(self):
+        # (tau, ambient) from the samples of this cooling alone, None until they allow one
+        if self.n < self.minPairs:
+            return None
+        denominator = self.n*self.sumXX - self.sumX*self.sumX
+        if denominator <= 0:
+            return None
+        slope = (self.n*self.sumXY - self.sumX*self.sumY)/denominator
+        intercept = (self.sumY - slope*self.sumX)/self.n
+        if slope >= 0:
+            # not cooling, or not yet
+            return None
+        ambient = -intercept/slope
+        if not self.current == None and ambient >= self.current[1]:
+            return None
+        return (-1.0/slope, ambient)
+
+    def fit(self):
+        found = self.currentFit()
+        if found == None and not self.priorTau == None:
+            return (self.priorTau, self.priorAmbient)
+        return found
+
+    def timeToReach(self, threshold):
+        # seconds from the last sample until the temperature falls to threshold, 0 once
+        # it has, None when unknown or when the curve levels off above threshold
+        fit = self.fit()
+        if self.current == None:
+            return None
+        temp = self.current[1]
+        if temp <= threshold:
+            return 0.0
+        if fit == None:
+            return None
+        tau, ambient = fit
+        if ambient == None or threshold <= ambient:
+            return None
+        return tau*math.log((temp - ambient)/(threshold - ambient))
+
+    def end(self):
+        # the fit of a completed cooling is the prior for the next one
+        found = self.currentFit()
+        if not found == None:
+            self.priorTau, self.priorAmbient = found
+
+    def setPrior(self, tau, ambient):
+        self.priorTau = tau
+        self.priorAmbient = ambient
+
+def fitDecay(times, temps, spacing = 2.0, minDrop = 20.0):
+    # (tau, ambient) of recorded cooling, None if it does not look like cooling: the
+    # temperature has to fall by minDrop (°C) at least, as the noise on a plateau can
+    # otherwise fit a decay of its own
+    known = [temp for temp in temps if not temp == None]
+    if len(known) == 0 or known[0] - min(known) < minDrop:
+        return None
+    model = CoolingModel(spacing = spacing)
+    for t, temp in zip(times, temps):
+        model.add(t, temp)
+    return model.currentFit()
+
+def fitLog(path, channel = 3, spacing = 2.0, minDrop = 20.0):
+    # fits the cooling in a text run log, from the hottest sample of the channel on.
+    # A run log ends with its run, so only a log that went on through the cooling,
+    # such as one recorded by hand, has any to fit
+    import binary_log
+    entries = binary_log.readTXT(path)
+    times = [entry[0]*60.0 for entry in entries]
+    temps = [entry[2][channel] for entry in entries]
+    known = [n for n in range(len(temps)) if not temps[n] == None]
+    if len(known) == 0:
+        return None
+    peak = max(known, key=lambda n: temps[n])
+    return fitDecay(times[peak:], temps[peak:], spacing, minDrop)
+
+def priorFromLogs(paths, channel = 3):
+    # median tau and ambient of the logs that contain cooling, None if none do
+    fits = [fit for fit in (fitLog(path, channel) for path in paths) if not fit == None]
+    if len(fits) == 0:
+        return None
+    taus = sorted(fit[0] for fit in fits)
+    ambients = sorted(fit[1] for fit in fits)
+    return (taus[len(taus)//2], ambients[len(ambients)//2])
+
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        print(path, fitLog(path))
+    if len(sys.argv) > 2:
+        print("median", priorFromLogs(sys.argv[1:]))
@@ -0,0 +1,109 @@
+import asyncio
+import concurrent.futures
+import threading
+
+class Engine:
+    def __init__(self, ioWorkers = 1):
+        # one asyncio event loop on its own thread; blocking device calls go to a small
+        # dedicated executor and file writes to another, so neither holds up the loop
+        self.loop = asyncio.new_event_loop()
+        self.workerThreads = set()
+        self.ioExecutor = concurrent.futures.ThreadPoolExecutor(ioWorkers, "device-io", self.registerWorker)
+        self.fileExecutor = concurrent.futures.ThreadPoolExecutor(1, "file-io", self.registerWorker)
+        self.thread = None
+
+    def registerWorker(self):
+        self.workerThreads.add(threading.get_ident())
+
+    def start(self):
+        if self.thread == None:
+            self.thread = threading.Thread(target=self.loop.run_forever, name="engine", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        # cancels whatever is still scheduled and shuts the loop and executors down
+        if self.thread == None:
+            return
+        asyncio.run_coroutine_threadsafe(self.cancelAll(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.thread = None
+        self.ioExecutor.shutdown(wait=True)
+        self.fileExecutor.shutdown(wait=True)
+        self.loop.close()
+
+    async def cancelAll(self):
+        tasks = [task for task in asyncio.all_tasks(self.loop) if not task == asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def isEngineThread(self):
+        # True on the loop thread and on the executors' threads, where waiting on
+        # the engine would deadlock
+        return threading.current_thread() == self.thread or threading.get_ident() in self.workerThreads
+
+# Scheduling work
+
+    def submit(self, coroutine):
+        # runs a coroutine on the loop, returns a concurrent.futures.Future
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def call(self, func, *args):
+        # runs a plain function on the loop thread
+        self.loop.call_soon_threadsafe(func, *args)
+
+    async def io(self, func, *args):
+        # awaits a blocking device call made on the device I/O executor
+        return await self.loop.run_in_executor(self.ioExecutor, func, *args)
+
+    async def fileIO(self, func, *args):
+        return await self.loop.run_in_executor(self.fileExecutor, func, *args)
+
+    def forDevice(self, name, ioWorkers = 1):
+        # a view of this engine with a device I/O executor of its own, for running
+        # several devices on one loop without a slow one holding up the others
+        return DeviceEngine(self, name, ioWorkers)
+
+    def wait(self, future, timeout = 5.0):
+        # waits for a submitted coroutine to finish, cancelling it if it does not
+        if future == None or self.isEngineThread():
+            return
+        try:
+            future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+        except concurrent.futures.CancelledError:
+            pass
+
+class DeviceEngine:
+    def __init__(self, engine, name, ioWorkers = 1):
+        # shares the loop, the file executor and the loop thread of engine
+        self.engine = engine
+        self.loop = engine.loop
+        self.ioExecutor = concurrent.futures.ThreadPoolExecutor(ioWorkers, name, engine.registerWorker)
+
+    def start(self):
+        self.engine.start()
+
+    def stop(self):
+        # only the device executor is ours to shut down, the shared engine keeps running
+        self.ioExecutor.shutdown(wait=True)
+
+    def isEngineThread(self):
+        return self.engine.isEngineThread()
+
+    def submit(self, coroutine):
+        return self.engine.submit(coroutine)
+
+    def call(self, func, *args):
+        self.engine.call(func, *args)
+
+    async def io(self, func, *args):
+        return await self.loop.run_in_executor(self.ioExecutor, func, *args)
+
+    async def fileIO(self, func, *args):
+        return await self.engine.fileIO(func, *args)
+
+    def wait(self, future, timeout = 5.0):
+        self.engine.wait(future, timeout)
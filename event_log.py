@@ -0,0 +1,160 @@
+import atexit
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+import metrics
+
+# Event log: messages are put on a queue by the thread that raises them and written
+# by a background listener, so a slow console or disk never holds up a control tick;
+# each message carries structured fields alongside its text
+#
+#   event_log.info("flow rate set", tick = 12, mode = 1, setpoint = 2.5, temperatures = [...])
+
+logger = logging.getLogger("gcxgc")
+logger.propagate = False
+logger.setLevel(logging.INFO)
+
+levels = {"debug":logging.DEBUG, "info":logging.INFO, "warning":logging.WARNING, "error":logging.ERROR}
+
+class EnqueueHandler(logging.Handler):
+    # hands records to the listener as they are, the formatting is done on its thread;
+    # when the queue is full the record is dropped rather than waited on
+    def __init__(self, records):
+        logging.Handler.__init__(self)
+        self.records = records
+
+    def emit(self, record):
+        try:
+            self.records.put_nowait(record)
+        except queue.Full:
+            metrics.count("log_dropped")
+
+class RateLimit:
+    def __init__(self, interval = 10.0):
+        # lets a message through at most once per interval seconds and per device (its
+        # serial field, or its handle field), below ERROR; the next one through counts the repeats held back
+        # in its suppressed field.
+        # It is asked before a record is made, so a held back message costs little
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.last = {}
+
+    def allow(self, level, message, now, device = None):
+        # the number of repeats held back since the message last went out, None to hold it back
+        if level >= logging.ERROR or self.interval <= 0:
+            return 0
+        key = (message, device)
+        with self.lock:
+            entry = self.last.get(key)
+            if not entry == None and now - entry[0] < self.interval:
+                entry[1] += 1
+                return None
+            self.last[key] = [now, 0]
+            return 0 if entry == None else entry[1]
+
+def recordFields(record):
+    fields = dict(getattr(record, "fields", {}))
+    if getattr(record, "suppressed", 0) > 0:
+        fields["suppressed"] = record.suppressed
+    return fields
+
+class FieldFormatter(logging.Formatter):
+    # the usual text line, followed by the fields as key=value and then any traceback
+    def formatMessage(self, record):
+        text = logging.Formatter.formatMessage(self, record)
+        fields = recordFields(record)
+        if len(fields) == 0:
+            return text
+        return text + " " + " ".join(key + "=" + str(value) for key, value in fields.items())
+
+class JSONFormatter(logging.Formatter):
+    # one JSON object per line, the fields beside time, level and message
+    def format(self, record):
+        entry = {"time":record.created, "level":record.levelname, "message":record.getMessage()}
+        entry.update(recordFields(record))
+        if not record.exc_info == None:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default = str)
+
+# the handler feeding the queue and the listener draining it, once started
+handler = None
+listener = None
+rateLimit = RateLimit()
+startLock = threading.Lock()
+
+def start(path = None, level = "info", maxBytes = 10*1024*1024, backupCount = 5, console = True, consoleLevel = None,
+          rateInterval = 10.0, queueSize = 10000):
+    # starts the listener, writing to the console (stderr, so stdout is left to the
+    # program's own output) and to a rotating file of JSON lines at path when given;
+    # a listener already running is stopped first, with its queue drained
+    global handler, listener
+    import logging.handlers
+    stop()
+    setLevel(level)
+    rateLimit.interval = rateInterval
+    sinks = []
+    if console:
+        stream = logging.StreamHandler()
+        stream.setFormatter(FieldFormatter("%(asctime)s %(levelname)s %(message)s"))
+        stream.setLevel(levels[consoleLevel] if consoleLevel in levels else logging.NOTSET)
+        sinks.append(stream)
+    if not path == None:
+        rotating = logging.handlers.RotatingFileHandler(path, maxBytes = maxBytes, backupCount = backupCount)
+        rotating.setFormatter(JSONFormatter())
+        sinks.append(rotating)
+    records = queue.Queue(queueSize)
+    handler = EnqueueHandler(records)
+    logger.addHandler(handler)
+    listener = logging.handlers.QueueListener(records, *sinks, respect_handler_level = True)
+    listener.start()
+
+def stop():
+    # writes out what is queued and closes the sinks
+    global handler, listener
+    if not handler == None:
+        logger.removeHandler(handler)
+        handler = None
+    if not listener == None:
+        listener.stop()
+        for sink in listener.handlers:
+            sink.close()
+        listener = None
+
+atexit.register(stop)
+
+def setLevel(level):
+    logger.setLevel(levels[level] if level in levels else level)
+
+def event(level, message, exc_info = None, **fields):
+    # the console is written to unless start has been called with something else
+    if handler == None:
+        with startLock:
+            if handler == None:
+                start()
+    if not logger.isEnabledFor(level):
+        return
+    suppressed = rateLimit.allow(level, message, time.time(), fields.get("serial", fields.get("handle")))
+    if suppressed == None:
+        return
+    # made directly, as looking up the caller's source line would cost more than the rest
+    record = logger.makeRecord(logger.name, level, "", 0, message, (), exc_info, extra = {"fields":fields, "suppressed":suppressed})
+    logger.handle(record)
+
+def debug(message, **fields):
+    event(logging.DEBUG, message, **fields)
+
+def info(message, **fields):
+    event(logging.INFO, message, **fields)
+
+def warning(message, **fields):
+    event(logging.WARNING, message, **fields)
+
+def error(message, **fields):
+    event(logging.ERROR, message, **fields)
+
+def exception(message, **fields):
+    # an error with the traceback of the exception being handled
+    event(logging.ERROR, message, sys.exc_info(), **fields)
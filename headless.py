@@ -0,0 +1,284 @@
+import time
+startClock = time.perf_counter()
+
+import argparse
+import configparser
+import json
+import sys
+
+# Headless runner: starts a method from a config file without the Tk GUI
+#
+#   [method]
+#   mode = time                  ; manual, time or temp (or 0, 1, 2)
+#   profile = profiles/run.txt   ; flow vs time profile
+#   interval = 60                ; seconds per profile step
+#   flow = 5                     ; manual flow rate (L/min)
+#   calibration =                ; flow vs temp calibration points
+#   channels =                   ; temperature channel config, see channels.py
+#   max_time = 50                ; GC runtime (min)
+#   cooling_temperature = 999    ; oven cooling temperature, outside 20-250 disables cooling
+#   prepare_lead = 0             ; arm the next run this many seconds before the oven is cool
+#   cooling_logs =               ; run logs with oven cooling, to estimate cooling before it is measured
+#   pulse_period = 6             ; hot jet pulse period (s)
+#   pulse_width = 300            ; hot jet pulse width (ms)
+#   repeat = no                  ; re-arm the trigger after each run
+#   wait_for_trigger = yes
+#   control_rate = 1             ; control loop rate (Hz)
+#   backend = ljm                ; ljm or simulated
+
+modes = {"manual":0, "time":1, "temp":2, "0":0, "1":1, "2":2}
+
+defaults = {"mode":"manual", "profile":"", "interval":"60", "flow":"1", "calibration":"", "channels":"",
+            "max_time":"50", "cooling_temperature":"999", "prepare_lead":"0", "cooling_logs":"", "pulse_period":"6", "pulse_width":"300",
+            "repeat":"no", "wait_for_trigger":"yes", "control_rate":"1", "backend":"ljm"}
+
+def readMethod(path):
+    parser = configparser.ConfigParser(defaults = defaults, inline_comment_prefixes = (";", "#"))
+    if len(parser.read(path)) == 0:
+        raise SystemExit("cannot read " + path)
+    if not parser.has_section("method"):
+        raise SystemExit(path + " has no [method] section")
+    method = parser["method"]
+    mode = method.get("mode").strip().lower()
+    if not mode in modes:
+        raise SystemExit("unknown mode " + repr(mode) + ", expected manual, time or temp")
+    if modes[mode] == 1 and len(method.get("profile").strip()) == 0:
+        raise SystemExit("flow vs time needs a profile")
+    return {"mode":modes[mode],
+            "profile":method.get("profile").strip() or None,
+            "interval":method.getfloat("interval"),
+            "flow":method.getfloat("flow"),
+            "calibration":method.get("calibration").strip() or None,
+            "channels":method.get("channels").strip() or None,
+            "maxTime":method.getfloat("max_time")*60,
+            "coolingTemperature":method.getfloat("cooling_temperature"),
+            "prepareLead":method.getfloat("prepare_lead"),
+            "coolingLogs":method.get("cooling_logs").split(),
+            "pulsePeriod":method.getfloat("pulse_period"),
+            "pulseWidth":method.getfloat("pulse_width"),
+            "repeat":method.getboolean("repeat"),
+            "waitForTrigger":method.getboolean("wait_for_trigger"),
+            "controlRate":method.getfloat("control_rate"),
+            "backend":method.get("backend").strip().lower()}
+
+def makeBackend(name, devices = 1):
+    # only the backend in use is imported; devices is the number of simulated LabJacks
+    if name == "simulated":
+        import simulated_t7
+        return simulated_t7.SimulatedLJM(devices)
+    if name == "ljm":
+        return None
+    raise SystemExit("unknown backend " + repr(name) + ", expected ljm or simulated")
+
+def configureMethod(app, method):
+    # the same settings the GUI makes when a mode is started; raises OSError or
+    # ValueError when the profile, the calibration or the channels cannot be loaded
+    if not method["channels"] == None:
+        app.setChannelFile(method["channels"])
+    app.setMode(method["mode"])
+    app.setMaxTime(method["maxTime"])
+    app.setCoolingTemperature(method["coolingTemperature"])
+    app.setPrepareLead(method["prepareLead"])
+    if len(method["coolingLogs"]) > 0:
+        import cooling_model
+        prior = cooling_model.priorFromLogs(method["coolingLogs"])
+        if not prior == None:
+            app.setCoolingPrior(prior[0], prior[1])
+    app.setPulsePeriod(method["pulsePeriod"])
+    app.setPulseWidth(method["pulseWidth"])
+    app.setRepeat(method["repeat"])
+    app.setControlRate(method["controlRate"])
+    if method["mode"] == 0:
+        app.setFlowRate(method["flow"])
+    elif method["mode"] == 1:
+        app.setProfile(method["profile"])
+        app.setTimeInterval(method["interval"])
+    else:
+        if not method["calibration"] == None:
+            app.setCalibrationFile(method["calibration"])
+        app.setTimeInterval(10)
+
+def startMethod(app, method):
+    try:
+        configureMethod(app, method)
+    except (OSError, ValueError) as error:
+        app.shutdown()
+        raise SystemExit("the method could not be loaded: " + str(error))
+    if method["mode"] == 0:
+        app.start(waitForTrigger = False, resetTime = True)
+    else:
+        app.start(method["waitForTrigger"], True)
+
+def startSequence(app, paths, methods):
+    # several method files make an autosampler sequence, one run per file in order; the
+    # pulse, control rate and backend settings of the first file apply to all of them
+    import sequence
+    runner = sequence.SequenceRunner(app, [sequence.runFromMethod(path, method) for path, method in zip(paths, methods)])
+    try:
+        configureMethod(app, methods[0])
+    except (OSError, ValueError) as error:
+        app.shutdown()
+        raise SystemExit("the method could not be loaded: " + str(error))
+    runner.start()
+    return runner
+
+def isFinished(app, method, runner = None):
+    # a single triggered run, or the last run of a sequence, is over once it has stopped
+    # and the oven has cooled
+    snapshot = app.getSnapshot()
+    if not runner == None:
+        return runner.isFinished() and not snapshot == None and not snapshot.isRunning and not snapshot.ovenIsCooling
+    if method["repeat"] or method["mode"] == 0 or snapshot == None:
+        return False
+    return snapshot.triggeredStart and not snapshot.isRunning and not snapshot.isArmed and not snapshot.ovenIsCooling
+
+def parseDevices(text):
+    # None for every attached LabJack, otherwise the serial numbers listed
+    if text.strip().lower() == "all":
+        return None
+    try:
+        return [int(serial) for serial in text.split(",") if len(serial.strip()) > 0]
+    except ValueError:
+        raise SystemExit("--devices takes all or serial numbers separated by commas")
+
+def runDevices(args, method):
+    # the method runs on several LabJacks at once, each with its own control loop, run
+    # logs (named with its serial number) and device I/O executor on one event loop
+    import multi_device
+    serials = parseDevices(args.devices)
+    devices = args.simulated_devices if serials == None else len(serials)
+    controller = multi_device.MultiDeviceController(method["mode"], makeBackend(method["backend"], devices), serials)
+    if len(controller) == 0:
+        controller.shutdown()
+        raise SystemExit("no LabJack found")
+    applications = [controller.getApplication(serial) for serial in controller.getSerials()]
+    try:
+        for app in applications:
+            if args.supervise:
+                app.startSupervisor(args.supervise_interval)
+            startMethod(app, method)
+        if not args.metrics == None:
+            # the metrics are the process's, so one exporter covers every device
+            applications[0].startMetricsExport(args.metrics, args.metrics_interval, args.metrics_format)
+
+        began = time.monotonic()
+        lastStatus = began
+        while not all(isFinished(app, method) for app in applications):
+            if not args.duration == None and time.monotonic() - began >= args.duration:
+                break
+            if args.status > 0 and time.monotonic() - lastStatus >= args.status:
+                lastStatus = time.monotonic()
+                for serial, snapshot in controller.getSnapshots().items():
+                    print(serial, snapshot)
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        controller.shutdown()
+
+def peakMemory():
+    # peak resident set size in kilobytes, where the platform reports it
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak = peak/1024
+    return peak
+
+def watchProfileSignal(app, every, path, on):
+    # SIGUSR1 switches sampled tick profiling on, and off again writing the statistics
+    import signal
+    if not hasattr(signal, "SIGUSR1"):
+        return
+    state = {"on":on}
+    def toggle(number, frame):
+        state["on"] = not state["on"]
+        app.setProfiling(every if state["on"] else 0)
+        if not state["on"] and app.dumpProfile(path):
+            print("tick profile written to " + path)
+    signal.signal(signal.SIGUSR1, toggle)
+
+def main(arguments):
+    parser = argparse.ArgumentParser(description = "Run a GCxGC method without the GUI")
+    parser.add_argument("methods", nargs = "+", help = "method config file, or several to run as a sequence")
+    parser.add_argument("--duration", type = float, default = None, help = "stop after this many seconds")
+    parser.add_argument("--status", type = float, default = 0, help = "print the state every this many seconds")
+    parser.add_argument("--measure-startup", action = "store_true", help = "print startup time and memory, then exit")
+    parser.add_argument("--metrics", default = None, help = "write metrics to this file periodically")
+    parser.add_argument("--metrics-format", choices = ["json", "prometheus"], default = "json")
+    parser.add_argument("--metrics-interval", type = float, default = 10.0)
+    parser.add_argument("--profile-every", type = int, default = 0, help = "profile one tick in this many, SIGUSR1 toggles profiling")
+    parser.add_argument("--profile-output", default = "tick.prof", help = "pstats file written when profiling stops")
+    parser.add_argument("--log-file", default = None, help = "write the event log here as JSON lines, rotated by size")
+    parser.add_argument("--log-level", choices = ["debug", "info", "warning", "error"], default = "info")
+    parser.add_argument("--log-max-bytes", type = int, default = 10*1024*1024)
+    parser.add_argument("--log-backups", type = int, default = 5)
+    parser.add_argument("--supervise", action = "store_true", help = "wait for a missing LabJack and reconnect a lost one")
+    parser.add_argument("--supervise-interval", type = float, default = 1.0, help = "seconds between connection checks")
+    parser.add_argument("--devices", default = None, help = "run the method on several LabJacks: all, or serial numbers separated by commas")
+    parser.add_argument("--simulated-devices", type = int, default = 1, help = "number of LabJacks the simulated backend has with --devices all")
+    args = parser.parse_args(arguments)
+    methods = [readMethod(path) for path in args.methods]
+    method = methods[0]
+    if not args.devices == None and len(methods) > 1:
+        raise SystemExit("--devices runs one method, not a sequence")
+
+    # the application and its dependencies are only imported once the method is known to be valid
+    import event_log
+    event_log.start(args.log_file, args.log_level, args.log_max_bytes, args.log_backups)
+    if not args.devices == None:
+        runDevices(args, method)
+        return
+    import application
+    app = application.Application(method["mode"], backend = makeBackend(method["backend"]))
+    if args.supervise:
+        app.startSupervisor(args.supervise_interval)
+        if not app.supervisor.waitConnected(args.duration):
+            app.shutdown()
+            raise SystemExit("no LabJack found")
+    elif app.handle == None:
+        app.shutdown()
+        raise SystemExit("no LabJack found")
+    if not args.metrics == None:
+        app.startMetricsExport(args.metrics, args.metrics_interval, args.metrics_format)
+    app.setProfiling(args.profile_every)
+    watchProfileSignal(app, args.profile_every or 10, args.profile_output, args.profile_every > 0)
+    runner = None
+    if len(methods) > 1:
+        runner = startSequence(app, args.methods, methods)
+    else:
+        startMethod(app, method)
+
+    if args.measure_startup:
+        print(json.dumps({"startup_seconds":time.perf_counter() - startClock,
+                          "peak_rss_kb":peakMemory(),
+                          "modules":len(sys.modules)}))
+        app.shutdown()
+        return
+
+    began = time.monotonic()
+    lastStatus = began
+    try:
+        while not isFinished(app, method, runner):
+            if not args.duration == None and time.monotonic() - began >= args.duration:
+                break
+            if args.status > 0 and time.monotonic() - lastStatus >= args.status:
+                lastStatus = time.monotonic()
+                print(app.getSnapshot())
+                if not runner == None:
+                    print(json.dumps(runner.getReport()))
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if app.dumpProfile(args.profile_output):
+            print("tick profile written to " + args.profile_output)
+        if not runner == None:
+            runner.stop()
+            print(json.dumps(runner.getReport()))
+        app.shutdown()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
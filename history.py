@@ -0,0 +1,190 @@
+import array
+import collections
+import math
+
+# Fixed-capacity history of the control loop's samples, one preallocated ring of doubles
+# per column, with statistics over the most recent samples kept up to date as they arrive
+
+COLUMNS = ["time", "flow", "temp0", "temp1", "temp2", "temp3"]
+
+class WindowStats:
+    def __init__(self, window):
+        # min, max, mean and least squares slope of the last window samples of one column;
+        # NaN samples (unknown values) take up a place in the window but are left out
+        self.window = window
+        self.clear()
+
+    def clear(self):
+        self.lows = collections.deque()
+        self.highs = collections.deque()
+        self.n = 0
+        self.sumT = 0.0
+        self.sumV = 0.0
+        self.sumTT = 0.0
+        self.sumTV = 0.0
+
+    def add(self, index, t, value):
+        if math.isnan(value):
+            return
+        # the deques hold the candidates for the window's minimum and maximum in order,
+        # so each sample is pushed and popped once at most
+        while len(self.lows) > 0 and self.lows[-1][1] >= value:
+            self.lows.pop()
+        self.lows.append((index, value))
+        while len(self.highs) > 0 and self.highs[-1][1] <= value:
+            self.highs.pop()
+        self.highs.append((index, value))
+        self.n += 1
+        self.sumT += t
+        self.sumV += value
+        self.sumTT += t*t
+        self.sumTV += t*value
+
+    def remove(self, index, t, value):
+        # the sample at index has left the window
+        if len(self.lows) > 0 and self.lows[0][0] <= index:
+            self.lows.popleft()
+        if len(self.highs) > 0 and self.highs[0][0] <= index:
+            self.highs.popleft()
+        if math.isnan(value):
+            return
+        self.n -= 1
+        self.sumT -= t
+        self.sumV -= value
+        self.sumTT -= t*t
+        self.sumTV -= t*value
+
+    def min(self):
+        try:
+            return self.lows[0][1]
+        except IndexError:
+            return None
+
+    def max(self):
+        try:
+            return self.highs[0][1]
+        except IndexError:
+            return None
+
+    def mean(self):
+        if self.n == 0:
+            return None
+        return self.sumV/self.n
+
+    def slope(self):
+        # change per second
+        if self.n < 2:
+            return None
+        denominator = self.n*self.sumTT - self.sumT*self.sumT
+        if denominator <= 0:
+            return None
+        return (self.n*self.sumTV - self.sumT*self.sumV)/denominator
+
+class History:
+    def __init__(self, capacity = 3600, window = 60, recomputeEvery = 16):
+        # keeps the last capacity samples; statistics cover the last window of them, and
+        # the running sums are rebuilt every recomputeEvery windows so rounding errors
+        # cannot build up over a long session
+        self.capacity = capacity
+        self.columns = {name: array.array('d', bytes(8*capacity)) for name in COLUMNS}
+        self.stats = {name: WindowStats(min(window, capacity)) for name in COLUMNS[1:]}
+        self.window = min(window, capacity)
+        self.recomputeEvery = recomputeEvery
+        self.count = 0
+        self.origin = None
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, t, flow, temperatures):
+        # one sample; unknown values (None) are kept as NaN
+        if self.origin == None:
+            # times in the sums are counted from the first sample, to keep them small
+            self.origin = t
+        index = self.count
+        old = index - self.window
+        if old >= 0:
+            # the oldest sample of the window leaves it, before its slot can be reused
+            oldPosition = old % self.capacity
+            oldTime = self.columns["time"][oldPosition] - self.origin
+            for name in COLUMNS[1:]:
+                self.stats[name].remove(old, oldTime, self.columns[name][oldPosition])
+        position = index % self.capacity
+        self.columns["time"][position] = t
+        values = [flow] + list(temperatures or [None]*4)
+        for name, value in zip(COLUMNS[1:], values):
+            self.columns[name][position] = float("nan") if value == None else value
+        self.count += 1
+        if self.count % (self.recomputeEvery*self.window) == 0:
+            self.recompute()
+            return
+        relative = t - self.origin
+        for name in COLUMNS[1:]:
+            self.stats[name].add(index, relative, self.columns[name][position])
+
+    def recompute(self):
+        # rebuilds the statistics from the samples in the window
+        first = max(0, self.count - self.window)
+        for name in COLUMNS[1:]:
+            stats = self.stats[name]
+            stats.clear()
+            for index in range(first, self.count):
+                position = index % self.capacity
+                stats.add(index, self.columns["time"][position] - self.origin, self.columns[name][position])
+
+    def setWindow(self, window):
+        self.window = min(window, self.capacity)
+        for stats in self.stats.values():
+            stats.window = self.window
+        self.recompute()
+
+    def clear(self):
+        self.count = 0
+        self.origin = None
+        for stats in self.stats.values():
+            stats.clear()
+
+# Statistics over the window, None while it holds no known values
+
+    def min(self, name):
+        return self.stats[name].min()
+
+    def max(self, name):
+        return self.stats[name].max()
+
+    def mean(self, name):
+        return self.stats[name].mean()
+
+    def slope(self, name):
+        # per second
+        return self.stats[name].slope()
+
+    def summary(self, name):
+        return {"min":self.min(name), "max":self.max(name), "mean":self.mean(name), "slope":self.slope(name)}
+
+# Access to the samples
+
+    def latest(self):
+        if self.count == 0:
+            return None
+        position = (self.count - 1) % self.capacity
+        return {name: self.columns[name][position] for name in COLUMNS}
+
+    def views(self, name):
+        # the column's samples oldest first, as two memoryviews of the ring without copying;
+        # they show whatever is written later into the same slots
+        data = memoryview(self.columns[name])
+        if self.count <= self.capacity:
+            return [data[:self.count], data[0:0]]
+        split = self.count % self.capacity
+        return [data[split:], data[:split]]
+
+    def numpyViews(self, name):
+        # the same two views as NumPy arrays, still without copying
+        import numpy
+        return [numpy.frombuffer(view, dtype=float) for view in self.views(name)]
+
+    def column(self, name):
+        # a copy of the column, oldest first
+        older, newer = self.views(name)
+        return array.array('d', older.tobytes() + newer.tobytes())
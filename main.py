@@ -1,13 +1,17 @@
 import tkinter as tk
 import application
 from tkinter.filedialog import askopenfilename
-from apscheduler.scheduler import Scheduler
+from tkinter import messagebox
 import application_helper
+import profiles
+import engine
+import trend_plot
+import event_log
 
-# APScheduler setup
+# Event loop engine setup, shared by the display refresh and the application
 
-sched = Scheduler()
-sched.start()
+appEngine = engine.Engine()
+appEngine.start()
 
 # Declare global variables
 
@@ -15,7 +19,16 @@ updateJob = None
 updateTime = False
 filename = None
 
-app = application.Application()
+# milliseconds between display refreshes, and the text each label shows now
+refreshInterval = 500
+shownText = {}
+
+# sequence number of the last snapshot added to the trend plot
+trendSequence = None
+
+app = application.Application(engine = appEngine)
+# a LabJack that is missing or unplugged is connected as soon as it is there
+app.startSupervisor()
 
 labels = {0:"Oven temperature: \t",
           1:"Cold jet temperature: \t",
@@ -25,7 +38,7 @@ labels = {0:"Oven temperature: \t",
 # Setup Tkinter
 
 GUI = tk.Tk()
-GUI.geometry('800x500')
+GUI.geometry('800x690')
 GUI.title('GCxGC')
 
 # Declare Tkinter string variables for Entry fields
@@ -39,31 +52,34 @@ pulseWidth = tk.StringVar()
 minimumTemperature = tk.StringVar()
 repeat = tk.IntVar()
 
-# Mode starter methods
+# Mode starter methods; anything that may talk to the LabJack goes through app.submit,
+# so it runs between control loop ticks rather than on the Tk thread
 
 def setManualFlowRate():
     begin(0)
     flowRate = application_helper.string_default(manualFlowRate.get(), 1)
-    if not app.getIsRunning():
-        app.start(waitForTrigger = False, resetTime = True)
 
-    app.setFlowRate(flowRate)
+    def startManual():
+        if not app.getIsRunning():
+            app.start(waitForTrigger = False, resetTime = True)
+        app.setFlowRate(flowRate)
+    app.submit(startManual)
     updateFlowRateDisplay()
 
 def beginTime(waitForTrigger = False):
-    begin(1)
-
     try:
-        file = open(filename)
-    except TypeError:
-        file = None
-        
+        profile = profiles.loadProfile(filename)
+    except (OSError, ValueError) as error:
+        messagebox.showerror("Flow vs Time", "The profile could not be loaded:\n" + str(error))
+        return
+
+    begin(1)
     app.setMode(1)
-    app.setFile(file)
+    app.setArray(profile)
     
     timeInterval = application_helper.string_default(flowVsTimeInterval.get(), 60)
     app.setTimeInterval(timeInterval)
-    app.start(waitForTrigger, True)
+    app.submit(app.start, waitForTrigger, True)
 
     beginUpdateJob()
 
@@ -71,7 +87,7 @@ def beginTemp(waitForTrigger = False):
     begin(2)
     timeInterval = 10
     app.setTimeInterval(timeInterval)
-    app.start(waitForTrigger, True)
+    app.submit(app.start, waitForTrigger, True)
 
     beginUpdateJob()
 
@@ -85,7 +101,7 @@ def begin(modeNumber):
     startPulse(manual = False)
 
 def setCoolingInfo():
-    print("cooling info set")
+    event_log.info("cooling info set")
     app.setMaxTime((application_helper.string_default(maxTimeEntry.get(), 50))*60)
     app.setCoolingTemperature(application_helper.string_default(minimumTemperature.get(), 999))
 
@@ -100,50 +116,102 @@ def waitTemp():
 # Stop
 
 def stop():
-    app.stopRun()
+    app.submit(app.stopRun)
     global updateTime
     updateTime = False
     
 # General update display method
 
 def updateDisplays():
-    try:
-        updateFlowRateDisplay()
-        updateTemperatureDisplay()
-        if app.getIsRunning() and app.getTriggeredStart():
-            updateTimeDisplay()
-        setCoolingInfo()
-    except RuntimeError:
-        stopUpdateJob()
-    
+    # runs on the Tk thread and draws the latest snapshot published by the control loop
+    snapshot = app.getSnapshot()
+    updateFlowRateDisplay(snapshot)
+    updateTemperatureDisplay(snapshot)
+    updateTrendPlot(snapshot)
+    updateReadyDisplay(snapshot)
+    if not snapshot == None and snapshot.isRunning and snapshot.triggeredStart:
+        updateTimeDisplay(snapshot)
+    setCoolingInfo()
 
 # Update display helper methods
 
-def updateFlowRateDisplay():
-    flowRate = app.getCurrentFlowRate()
-    currentFlowRate.config(text="Current flow rate: \t\t"+str(application_helper.formatValue(flowRate, 1))+" L/min")
+def setLabel(label, text):
+    # only labels whose text changed are redrawn
+    if not shownText.get(label) == text:
+        label.config(text=text)
+        shownText[label] = text
 
-def updateTemperatureDisplay():
-    for n in labels.keys():
-        temperatureDisplay[n].config(text=labels[n]+str(application_helper.formatValue(app.getTemperature(n), 1))+" °C")
-
-def updateTimeDisplay():
-    time = app.getTimeElapsed()
-    timeDisplay.config(text="Time elapsed:\t\t"+ application_helper.formatTime(time)+" min")
+def updateFlowRateDisplay(snapshot = None):
+    if snapshot == None:
+        flowRate = app.getCurrentFlowRate()
+    else:
+        flowRate = snapshot.flowRate
+    setLabel(currentFlowRate, "Current flow rate: \t\t"+str(application_helper.formatValue(flowRate, 1))+" L/min")
 
-# APScheduler Helpers
+def updateTemperatureDisplay(snapshot):
+    for n in labels.keys():
+        if snapshot == None or snapshot.temperatures == None:
+            temperature = None
+        else:
+            temperature = snapshot.temperatures[n]
+        setLabel(temperatureDisplay[n], labels[n]+str(application_helper.formatValue(temperature, 1))+" °C")
+
+def updateTimeDisplay(snapshot):
+    setLabel(timeDisplay, "Time elapsed:\t\t"+ application_helper.formatTime(snapshot.timeElapsed)+" min")
+
+def updateReadyDisplay(snapshot):
+    if not app.isConnected():
+        setLabel(readyDisplay, "LabJack disconnected, reconnecting")
+    elif snapshot == None or not snapshot.ovenIsCooling:
+        setLabel(readyDisplay, "")
+    elif snapshot.timeToReady == None:
+        setLabel(readyDisplay, "Oven ready in: \t\testimating")
+    else:
+        setLabel(readyDisplay, "Oven ready in: \t\t"+application_helper.formatTime(snapshot.timeToReady)+" min")
+
+def updateTrendPlot(snapshot):
+    # each snapshot is plotted once, however often the display refreshes
+    global trendSequence
+    if not snapshot == None and not snapshot.sequence == trendSequence:
+        trendSequence = snapshot.sequence
+        temperatures = snapshot.temperatures or [None]*4
+        trendPlot.add(list(temperatures) + [snapshot.flowRate])
+    trendPlot.redraw()
+
+# Display refresh helpers
 
 def beginUpdateJob():
     global updateJob
     stopUpdateJob()
-    updateJob = sched.add_interval_job(func=updateDisplays, seconds=1)
+    updateJob = GUI.after(0, refreshDisplays)
 
 def stopUpdateJob():
     global updateJob
     if not updateJob == None:
-        sched.unschedule_job(updateJob)
+        GUI.after_cancel(updateJob)
         updateJob = None
 
+def refreshDisplays():
+    # the next refresh is scheduled whatever happens to this one
+    global updateJob
+    try:
+        updateDisplays()
+    except Exception:
+        event_log.exception("display refresh failed")
+    finally:
+        updateJob = GUI.after(refreshInterval, refreshDisplays)
+
+def setRefreshInterval(milliseconds):
+    global refreshInterval
+    refreshInterval = milliseconds
+
+def quit():
+    # cancels everything running on the engine before the window goes away
+    stopUpdateJob()
+    app.shutdown()
+    appEngine.stop()
+    GUI.destroy()
+
 # Pulsing helper
 
 def startPulse(manual = True):
@@ -153,7 +221,7 @@ def startPulse(manual = True):
     app.setPulsePeriod(period)
     app.setPulseWidth(width)
     if manual:
-        app.start_pulse()
+        app.submit(app.start_pulse)
 
 # File loading helper
 
@@ -197,7 +265,7 @@ minTemp = [tk.Label(GUI, text="Cooling temperature (°C):"),
 temperatureDisplay = [tk.Label(GUI, text=labels[n]) for n in labels.keys()]
 
 pulse = [tk.Button(GUI, text="Start", command=startPulse),
-         tk.Button(GUI, text="Stop", command=app.stop_pulse),
+         tk.Button(GUI, text="Stop", command=lambda: app.submit(app.stop_pulse)),
          tk.Label(GUI, text="Pulse period (s):"),
          tk.Label(GUI, text="Pulse width (ms):"),
          tk.Entry(GUI, textvariable=pulsePeriod, bg = 'LightGray'),
@@ -206,8 +274,10 @@ pulse = [tk.Button(GUI, text="Start", command=startPulse),
 
 timeDisplay = tk.Label(GUI, text="Time elapsed: \t\t00.00 min")
 currentFlowRate = tk.Label(GUI, text="Current flow rate:\t")
+readyDisplay = tk.Label(GUI, text="")
 instrumentLabel = tk.Label(GUI, text="Instrument:",font = 'Helvetica 8 bold')
 repeatCheckbox = tk.Checkbutton(GUI, variable=repeat, text="Autosampler trigger reset", command=toggleRepeat)
+trendPlot = trend_plot.TrendPlot(GUI)
 
 # Place Tkinter objects to create user interface
 
@@ -251,8 +321,10 @@ pulse[6].place(x=10, y=380) # hot jet pulse label
 
 timeDisplay.place(x=450, y=70) # time elapsed label
 currentFlowRate.place(x=450, y=290) # current flow rate label
+readyDisplay.place(x=450, y=350) # predicted end of oven cooling
 instrumentLabel.place(x=450, y=10) # instrument label
 repeatCheckbox.place(x=450, y=320) # repeat checkbox
+trendPlot.place(x=10, y=500) # temperature and flow trend
 
 # Call updater setup methods
 
@@ -260,6 +332,8 @@ updateDisplays()
 beginUpdateJob()
 setManualFlowRate()
 
+GUI.protocol("WM_DELETE_WINDOW", quit)
+
 # Begin Tkinter mainloop
 
 GUI.mainloop()
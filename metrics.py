@@ -0,0 +1,192 @@
+import asyncio
+import bisect
+import cProfile
+import json
+import os
+import threading
+import time
+
+# Counters and latency histograms for the control loop's hot paths, kept in memory
+# and written out periodically as JSON or in the Prometheus text format
+
+# histogram bucket upper bounds in seconds, doubling from 10 us to about 10 s
+bounds = [0.00001*2**n for n in range(21)]
+
+class Histogram:
+    def __init__(self):
+        # the last bucket counts everything above the largest bound
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.buckets = [0]*(len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        n = bisect.bisect_left(bounds, seconds)
+        with self.lock:
+            self.buckets[n] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, fraction):
+        # upper bound of the bucket holding the percentile, so an overestimate by at most 2x
+        if self.count == 0:
+            return None
+        rank = fraction*self.count
+        seen = 0
+        for n, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank and count > 0:
+                return bounds[n] if n < len(bounds) else self.max
+        return self.max
+
+    def toDict(self):
+        return {"count":self.count, "sum":self.total, "max":self.max,
+                "p50":self.percentile(0.50), "p99":self.percentile(0.99),
+                "buckets":list(self.buckets)}
+
+# everything is recorded unless this is cleared
+enabled = True
+counters = {}
+histograms = {}
+registryLock = threading.Lock()
+
+def setEnabled(value):
+    global enabled
+    enabled = value
+
+def count(name, amount = 1):
+    if enabled:
+        with registryLock:
+            counters[name] = counters.get(name, 0) + amount
+
+def histogram(name):
+    found = histograms.get(name)
+    if found == None:
+        with registryLock:
+            found = histograms.setdefault(name, Histogram())
+    return found
+
+def observe(name, seconds):
+    if enabled:
+        histogram(name).observe(seconds)
+
+def reset():
+    with registryLock:
+        counters.clear()
+        for found in histograms.values():
+            found.reset()
+
+def snapshot():
+    with registryLock:
+        return {"time":time.time(),
+                "counters":dict(counters),
+                "histograms":{name: found.toDict() for name, found in histograms.items()}}
+
+# Export
+
+def toJSON():
+    return json.dumps(snapshot(), indent=1)
+
+def toPrometheus(prefix = "gcxgc_"):
+    state = snapshot()
+    lines = []
+    for name, value in sorted(state["counters"].items()):
+        lines.append("# TYPE " + prefix + name + " counter")
+        lines.append(prefix + name + " " + repr(value))
+    for name, found in sorted(state["histograms"].items()):
+        lines.append("# TYPE " + prefix + name + " histogram")
+        cumulative = 0
+        for n, bound in enumerate(bounds):
+            cumulative += found["buckets"][n]
+            lines.append(prefix + name + '_bucket{le="' + repr(bound) + '"} ' + str(cumulative))
+        lines.append(prefix + name + '_bucket{le="+Inf"} ' + str(found["count"]))
+        lines.append(prefix + name + "_sum " + repr(found["sum"]))
+        lines.append(prefix + name + "_count " + str(found["count"]))
+    return "\n".join(lines) + "\n"
+
+def writeFile(path, format = "json"):
+    # written to a temporary file and renamed, so a reader never sees half a file
+    text = toPrometheus() if format == "prometheus" else toJSON()
+    temporary = path + ".tmp"
+    with open(temporary, "w") as file:
+        file.write(text)
+    os.replace(temporary, path)
+
+class Exporter:
+    def __init__(self, path, engine, interval = 10.0, format = "json"):
+        # writes the metrics to path every interval seconds from a coroutine on an
+        # engine.Engine; format is "json" or "prometheus"
+        self.path = path
+        self.interval = interval
+        self.format = format
+        self.engine = engine
+        self.future = engine.submit(self.exportAsync())
+
+    async def exportAsync(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.engine.fileIO(self.export)
+
+    def export(self):
+        try:
+            writeFile(self.path, self.format)
+        except OSError as error:
+            # a full disk or a missing directory must not stop the control loop
+            count("export_errors")
+            import event_log
+            event_log.warning("metrics export failed", path = self.path, error = str(error))
+
+    def stop(self):
+        # writes the metrics one last time
+        if not self.future == None:
+            self.future.cancel()
+            self.future = None
+            self.export()
+
+# Sampled profiling of the control loop tick
+
+# one tick in every profileEvery is run under cProfile, none when 0
+profileEvery = 0
+profiler = None
+profiledTicks = 0
+profileLock = threading.Lock()
+
+def setProfiling(every):
+    # may be switched on and off while the loop is running; the statistics gathered so far are kept
+    global profileEvery, profiler
+    with profileLock:
+        profileEvery = max(0, int(every))
+        if profileEvery > 0 and profiler == None:
+            profiler = cProfile.Profile()
+
+def shouldProfile(tick):
+    return profileEvery > 0 and tick % profileEvery == 0
+
+def profileCall(func):
+    # runs func under the shared profiler
+    global profiledTicks
+    with profileLock:
+        if profiler == None:
+            return func()
+        profiledTicks += 1
+        return profiler.runcall(func)
+
+def dumpProfile(path):
+    # writes the statistics gathered so far in pstats format, readable with python -m pstats
+    with profileLock:
+        if profiler == None:
+            return False
+        profiler.dump_stats(path)
+        return True
+
+def clearProfile():
+    global profiler, profiledTicks
+    with profileLock:
+        profiler = cProfile.Profile() if profileEvery > 0 else None
+        profiledTicks = 0
@@ -1,4 +1,11 @@
+import array
+import bisect
+import calibration
+
 class Manual:
+    # the flow rate does not depend on the temperatures read in the same tick
+    usesTemperature = False
+
     def __init__(self, initialFlow = 0.0, flowLimits = [0.0, 20.0]):
         # initializes manual mode with some default values
         self.flowLimits = flowLimits
@@ -16,32 +23,70 @@ class Manual:
         # does nothing in manual mode, included for safety
         pass
 
+    def setBreakpoints(self, times, flows, interpolation = "step"):
+        # included for safety
+        pass
+
+    def setCalibration(self, curve):
+        # included for safety
+        pass
+
+    def loadCalibration(self, path):
+        # included for safety
+        pass
+
 class FlowVsTime:
+    usesTemperature = False
+
     def __init__(self, array = None, timeInterval = 1):
         # initializes time mode with some default values and array
         self.array = array
         self.timeInterval = timeInterval
         self.incrament = None
+        self.schedule = None
+        # True when the setpoints come from setBreakpoints rather than a fixed-step array
+        self.hasBreakpoints = False
+        self.buildSchedule()
 
     def setArray(self, array):
         self.array = array
+        self.hasBreakpoints = False
+        self.buildSchedule()
+
+    def setBreakpoints(self, times, flows, interpolation = "step"):
+        # (time in seconds, flow) breakpoints, held or linearly interpolated between
+        self.array = flows
+        self.hasBreakpoints = True
+        self.schedule = SetpointSchedule(times, flows, interpolation)
+
+    def buildSchedule(self):
+        # one step per array entry, timeInterval seconds apart
+        if self.array == None or self.hasBreakpoints:
+            return
+        self.schedule = SetpointSchedule(None, self.array, "step", self.timeInterval)
+
+    def precompute(self, period, duration):
+        # tabulates the setpoints every period seconds, for control loops running faster than 1 Hz
+        self.schedule.precompute(period, duration)
 
     def getFlowRate(self, timeElapsed, temperature):
-        # uses the time elapsed to calculate the correct incrament/list position
-        incrament = int((timeElapsed - (timeElapsed % self.getTimeInterval()))/self.timeInterval)
-        if incrament in range(len(self.array)):
-            # if that is a valid list position, the value is returned
-            return self.timeToFlow(incrament)
-        else:
-            # if the list position is out of bounds, the last value is returned
-            return self.timeToFlow(len(self.array)-1)
+        # looks up the setpoint for the time elapsed, the last value is held past the end
+        return self.schedule.valueAt(timeElapsed)
 
     def setFlowRate(self, flow):
         # included for safety
         pass
 
+    def setCalibration(self, curve):
+        # included for safety
+        pass
+
+    def loadCalibration(self, path):
+        # included for safety
+        pass
+
     def timeToFlow(self, time):
-        # returns value at array position, used by getFlowRate
+        # returns value at array position
         return self.array[time]
 
     def getArray(self):
@@ -49,15 +94,99 @@ class FlowVsTime:
 
     def setTimeInterval(self, tI):
         self.timeInterval = tI
+        self.buildSchedule()
 
     def getTimeInterval(self):
         return self.timeInterval
 
+class SetpointSchedule:
+    def __init__(self, times, flows, interpolation = "step", interval = None):
+        # piecewise setpoints through (time, flow) breakpoints with increasing times, or,
+        # when times is None, one breakpoint every interval seconds found by division
+        if not interpolation in ["step", "linear"]:
+            raise ValueError("interpolation must be 'step' or 'linear'")
+        if not times == None and not len(times) == len(flows):
+            raise ValueError("times and flows must be of equal length")
+        if not times == None:
+            for n in range(1, len(times)):
+                if times[n] <= times[n-1]:
+                    raise ValueError("breakpoint times must increase")
+        if len(flows) == 0:
+            raise ValueError("a schedule needs at least one breakpoint")
+        self.times = times
+        self.flows = flows
+        self.interpolation = interpolation
+        self.interval = interval
+        # segment found by the last lookup, so steadily advancing time is found in O(1)
+        self.cursor = 0
+        self.table = None
+        self.tablePeriod = None
+
+    def timeAt(self, n):
+        if self.times == None:
+            return n*self.interval
+        return self.times[n]
+
+    def segment(self, t):
+        # index of the last breakpoint at or before t (-1 before the first one)
+        if self.times == None:
+            return min(int(t // self.interval), len(self.flows) - 1)
+        times = self.times
+        last = len(times) - 1
+        n = self.cursor
+        if t >= times[n]:
+            # a few steps forward from the cursor before falling back to bisection
+            steps = 0
+            while n < last and times[n+1] <= t and steps < 4:
+                n += 1
+                steps += 1
+            if n < last and times[n+1] <= t:
+                n = bisect.bisect_right(times, t, n) - 1
+        else:
+            n = bisect.bisect_right(times, t, 0, n) - 1
+            if n < 0:
+                return -1
+        self.cursor = n
+        return n
+
+    def valueAt(self, t):
+        if not self.table == None:
+            # a tick at a multiple of the period must not round down to the entry before it
+            n = int(t / self.tablePeriod + 1e-9)
+            if n >= 0 and n < len(self.table):
+                return self.table[n]
+        return self.evaluate(t)
+
+    def evaluate(self, t):
+        n = self.segment(t)
+        if n < 0:
+            return self.flows[0]
+        if n >= len(self.flows) - 1 or self.interpolation == "step":
+            return self.flows[n]
+        t0 = self.timeAt(n)
+        t1 = self.timeAt(n+1)
+        return self.flows[n] + (self.flows[n+1] - self.flows[n])*(t - t0)/(t1 - t0)
+
+    def precompute(self, period, duration):
+        # the setpoint at every multiple of period up to duration; lookups then cost one division
+        self.table = None
+        self.cursor = 0
+        table = array.array('d', bytes(8*(int(duration / period) + 1)))
+        for n in range(len(table)):
+            table[n] = self.evaluate(n*period)
+        self.cursor = 0
+        self.table = table
+        self.tablePeriod = period
+        return table
+
 class FlowVsTemp:
+    usesTemperature = True
+
     def __init__(self, timeInterval = 30):
         # initializes temperature mode with some default values
         self.timeInterval = timeInterval
         self.offset = 0.5
+        self.curve = calibration.defaultCurve(self.offset)
 
     def getFlowRate(self, timeElapsed, temp):
         return self.tempToFlow(temp)
@@ -67,17 +196,24 @@ class FlowVsTemp:
         pass
 
     def tempToFlow(self, temp):
-        if temp > 60:
-            # if the temperature is above a certain threshold, the function is used
-            return (-4.366E-7*(temp**3))+(4.625E-4*(temp**2))-(0.1678*temp)+22.69+(self.offset)
-        else:
-            # otherwise, an arbitrary maximum value is returned
-            return 15
+        # interpolated from the calibration curve's precomputed table
+        return self.curve.tempToFlow(temp)
+
+    def setCalibration(self, curve):
+        self.curve = curve
+        self.offset = curve.offset
+
+    def loadCalibration(self, path):
+        self.setCalibration(calibration.loadCalibration(path))
         
     def setArray(self, array):
         # included for safety
         pass
 
+    def setBreakpoints(self, times, flows, interpolation = "step"):
+        # included for safety
+        pass
+
     def setTimeInterval(self, timeInterval):
         self.timeInterval = timeInterval
 
@@ -0,0 +1,63 @@
+import application
+import application_helper
+import engine as engine_module
+import event_log
+
+class MultiDeviceController:
+    def __init__(self, controlMode = 0, backend = None, serials = None, applicationClass = application.Application):
+        # one Application per attached LabJack (or per serial number given), all on one
+        # event loop; every device gets a device I/O executor of its own, so a slow or
+        # unplugged device only delays its own ticks
+        self.engine = engine_module.Engine()
+        self.engine.start()
+        if serials == None:
+            serials = application_helper.listDevices(backend)
+        self.applications = {}
+        self.deviceEngines = {}
+        for serial in serials:
+            deviceEngine = self.engine.forDevice("device-io-" + str(serial))
+            app = applicationClass(controlMode, backend, deviceEngine, serial)
+            if app.handle == None:
+                # listed, but it could not be opened, for example because another process has it
+                event_log.warning("LabJack could not be opened", serial = serial)
+                app.shutdown()
+                deviceEngine.stop()
+                continue
+            self.applications[serial] = app
+            self.deviceEngines[serial] = deviceEngine
+
+    def getSerials(self):
+        return list(self.applications.keys())
+
+    def getApplication(self, serial):
+        return self.applications[serial]
+
+    def __len__(self):
+        return len(self.applications)
+
+# Start and stop every device
+
+    def startAll(self, waitForTrigger = False, resetTime = True):
+        for app in self.applications.values():
+            app.start(waitForTrigger, resetTime)
+
+    def stopAll(self):
+        for app in self.applications.values():
+            app.stopRun()
+
+    def shutdown(self):
+        # the applications stop their loops first, then their executors and the shared loop go
+        for serial, app in self.applications.items():
+            app.shutdown()
+            self.deviceEngines[serial].stop()
+        self.applications = {}
+        self.deviceEngines = {}
+        self.engine.stop()
+
+# Data from every device, keyed by serial number
+
+    def getSnapshots(self):
+        return {serial: app.getSnapshot() for serial, app in self.applications.items()}
+
+    def getControlStats(self):
+        return {serial: app.getControlStats() for serial, app in self.applications.items()}
@@ -0,0 +1,184 @@
+import array
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import mode_classes
+
+# Flow profiles for FlowVsTime
+#
+# a text profile has one flow rate per line; a binary profile is MAGIC, a
+# little-endian uint64 count and that many little-endian float64 flow rates
+
+MAGIC = b"GCXPRF\x00\x01"
+HEADER = struct.Struct("<8sQ")
+
+class ProfileError(ValueError):
+    pass
+
+# parsed profiles by absolute path and flow limits: (identity, digest, values),
+# identity telling a file apart from one written over it or put in its place
+cache = {}
+# parsed profiles by content digest, so a touched or copied file is not parsed again
+cacheByDigest = {}
+
+def fileIdentity(stat):
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+def lookup(key, stat):
+    # the cached values of a file that has not changed since; an entry for a changed
+    # file is dropped, so a binary profile's mapping does not outlive what it maps
+    cached = cache.get(key)
+    if cached == None:
+        return None
+    if cached[0] == fileIdentity(stat):
+        return cached[2]
+    del cache[key]
+    return None
+
+def forget(path):
+    # drops the entries of path under every flow limits
+    key = os.path.abspath(path)
+    for entry in [entry for entry in cache if entry[0] == key]:
+        del cache[entry]
+
+def defaultFlowLimits():
+    return mode_classes.Manual().flowLimits
+
+def loadProfile(path, flowLimits = None):
+    # returns the flow rates of a profile file as a compact sequence of doubles
+    if path == None:
+        # array with one arbitrary low default value to be used
+        return array.array('d', [1])
+    if flowLimits == None:
+        flowLimits = defaultFlowLimits()
+    key = os.path.abspath(path)
+    stat = os.stat(key)
+    # values range checked against other limits are checked again
+    cached = lookup((key, tuple(flowLimits)), stat)
+    if not cached == None:
+        return cached
+
+    with open(key, "rb") as file:
+        isBinary = file.read(len(MAGIC)) == MAGIC
+        if not isBinary:
+            file.seek(0)
+            data = file.read()
+
+    if isBinary:
+        # mapping costs nothing, only the range check has to look at the values
+        values = mapBinaryProfile(key)
+        digest = hashlib.sha1(values).hexdigest()
+        checkLimits(values, flowLimits, path)
+    else:
+        digest = hashlib.sha1(data).hexdigest()
+        values = cacheByDigest.get((digest, tuple(flowLimits)))
+        if values == None:
+            values = parseTextProfile(data, flowLimits, path)
+            cacheByDigest[(digest, tuple(flowLimits))] = values
+    cache[(key, tuple(flowLimits))] = (fileIdentity(stat), digest, values)
+    return values
+
+def parseTextProfile(data, flowLimits, path = "profile"):
+    # parses and range checks the flow rates in a single pass
+    values = array.array('d')
+    low, high = flowLimits
+    lineNumber = 0
+    for line in data.splitlines():
+        lineNumber += 1
+        line = line.strip()
+        if len(line) == 0:
+            continue
+        try:
+            flow = float(line)
+        except ValueError:
+            raise ProfileError(path + ", line " + str(lineNumber) + ": " + repr(line.decode("utf-8", "replace")) + " is not a flow rate")
+        if flow < low or flow > high:
+            raise ProfileError(path + ", line " + str(lineNumber) + ": flow rate " + str(flow) + " is outside " + str(low) + "-" + str(high))
+        values.append(flow)
+    if len(values) == 0:
+        raise ProfileError(path + " has no flow rates")
+    return values
+
+def loadBreakpoints(path, flowLimits = None):
+    # reads a two column text profile of (time in seconds, flow rate) breakpoints
+    if flowLimits == None:
+        flowLimits = defaultFlowLimits()
+    key = os.path.abspath(path)
+    stat = os.stat(key)
+    cached = lookup((key, tuple(flowLimits), "breakpoints"), stat)
+    if not cached == None:
+        return cached
+    with open(key, "rb") as file:
+        data = file.read()
+    digest = hashlib.sha1(data).hexdigest()
+    breakpoints = cacheByDigest.get((digest, tuple(flowLimits), "breakpoints"))
+    if breakpoints == None:
+        breakpoints = parseBreakpoints(data, flowLimits, path)
+        cacheByDigest[(digest, tuple(flowLimits), "breakpoints")] = breakpoints
+    cache[(key, tuple(flowLimits), "breakpoints")] = (fileIdentity(stat), digest, breakpoints)
+    return breakpoints
+
+def parseBreakpoints(data, flowLimits, path = "profile"):
+    times = array.array('d')
+    flows = array.array('d')
+    lineNumber = 0
+    for line in data.splitlines():
+        lineNumber += 1
+        fields = line.split()
+        if len(fields) == 0:
+            continue
+        try:
+            time, flow = float(fields[0]), float(fields[1])
+        except (ValueError, IndexError):
+            raise ProfileError(path + ", line " + str(lineNumber) + ": expected a time and a flow rate")
+        if flow < flowLimits[0] or flow > flowLimits[1]:
+            raise ProfileError(path + ", line " + str(lineNumber) + ": flow rate " + str(flow) + " is outside " + str(flowLimits[0]) + "-" + str(flowLimits[1]))
+        if len(times) > 0 and time <= times[-1]:
+            raise ProfileError(path + ", line " + str(lineNumber) + ": times must increase")
+        times.append(time)
+        flows.append(flow)
+    if len(times) == 0:
+        raise ProfileError(path + " has no breakpoints")
+    return times, flows
+
+def checkLimits(values, flowLimits, path = "profile"):
+    if len(values) == 0:
+        raise ProfileError(path + " has no flow rates")
+    if min(values) < flowLimits[0] or max(values) > flowLimits[1]:
+        raise ProfileError(path + ": flow rates " + str(min(values)) + "-" + str(max(values)) + " are outside " + str(flowLimits[0]) + "-" + str(flowLimits[1]))
+
+def mapBinaryProfile(path):
+    # memory-maps a binary profile and returns its flow rates without copying them
+    with open(path, "rb") as file:
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, count = HEADER.unpack_from(mapping, 0)
+    if not len(mapping) == HEADER.size + count*8:
+        raise ProfileError(path + " is truncated")
+    if sys.byteorder == "big":
+        values = array.array('d', mapping[HEADER.size:])
+        values.byteswap()
+        return values
+    return memoryview(mapping)[HEADER.size:].cast("d")
+
+def writeBinaryProfile(path, values):
+    # written to a temporary file and renamed, never over the old file in place, as a
+    # profile loaded from it may still be mapped
+    values = array.array('d', values)
+    if sys.byteorder == "big":
+        values.byteswap()
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        file.write(HEADER.pack(MAGIC, len(values)))
+        values.tofile(file)
+    os.replace(temporary, path)
+    forget(path)
+
+def convertProfile(textPath, binaryPath, flowLimits = None):
+    # pre-converts a text profile so later loads only map it
+    writeBinaryProfile(binaryPath, loadProfile(textPath, flowLimits))
+
+def clearCache():
+    cache.clear()
+    cacheByDigest.clear()
@@ -0,0 +1,140 @@
+import application
+import application_helper
+import binary_log
+import clocks
+import headless
+import simulated_t7
+import event_log
+import argparse
+import json
+import os
+import sys
+import time
+
+# Runs methods on simulated time, against the thermal model or the temperatures of a
+# recorded run, and writes the run log a real run would have written
+#
+#   python replay.py method.ini [more.ini ...] [--log recorded.txt.] [--output-dir DIR]
+
+class RecordedModel:
+    def __init__(self, entries):
+        # plays back the temperatures of [time (min), flow, temperatures] log entries
+        # in place of simulated_t7.ThermalModel, interpolating between them
+        if len(entries) == 0:
+            raise ValueError("the recorded log is empty")
+        self.times = [entry[0]*60.0 for entry in entries]
+        self.temperatures = [entry[2] for entry in entries]
+        self.elapsed = 0.0
+        self.cursor = 0
+        self.flow = 0.0
+        self.cooling = False
+        self.heating = False
+
+    def step(self, dt):
+        if dt > 0:
+            self.elapsed += dt
+
+    def read(self, channel):
+        t = self.elapsed
+        times = self.times
+        # time only moves forward, so the cursor does too
+        while self.cursor < len(times) - 2 and times[self.cursor + 1] <= t:
+            self.cursor += 1
+        n = self.cursor
+        low = self.temperatures[n][channel]
+        if t <= times[n] or n + 1 >= len(times):
+            return low
+        high = self.temperatures[n + 1][channel]
+        if t >= times[n + 1]:
+            return high
+        if low == None or high == None:
+            return high if low == None else low
+        return low + (high - low)*(t - times[n])/(times[n + 1] - times[n])
+
+class ReplayLog:
+    # stands in for run_logger.RunLogger, keeping the entries in memory
+    def __init__(self):
+        self.entries = []
+
+    def append(self, entry):
+        self.entries.append(entry)
+
+    def close(self):
+        pass
+
+class ReplayApplication(application.Application):
+    def newLogger(self):
+        self.replayLog = ReplayLog()
+        return self.replayLog
+
+    def beginReplay(self):
+        # a logged run, begun as if the autosampler trigger had just fired
+        self.updateLog = True
+        self.beginRun(True, True)
+
+def replayMethod(method, recorded = None, output = None):
+    # runs one method from headless.readMethod to its GC runtime, one control loop period
+    # per tick; returns the log entries and writes them to output when it is given
+    clock = clocks.SimulatedClock()
+    modelFactory = simulated_t7.ThermalModel
+    if not recorded == None:
+        modelFactory = lambda: RecordedModel(recorded)
+    backend = simulated_t7.SimulatedLJM(latency = 0, jitter = 0, modelFactory = modelFactory, clock = clock)
+    app = ReplayApplication(method["mode"], backend, clock = clock, stepped = True)
+    try:
+        headless.configureMethod(app, method)
+        if recorded == None:
+            # the oven program starts with the run
+            backend.devices[0].model.heating = True
+        app.beginReplay()
+        period = app.loop.period
+        while app.getIsRunning():
+            app.step()
+            clock.advance(period)
+        entries = app.replayLog.entries
+    finally:
+        app.shutdown()
+    if not output == None:
+        application_helper.writeLog(output, entries)
+    return entries
+
+def summarize(path, entries, seconds, output):
+    flows = [entry[1] for entry in entries]
+    return {"method":path, "entries":len(entries),
+            "simulated_minutes":entries[-1][0] if len(entries) > 0 else 0.0,
+            "min_flow":min(flows) if len(flows) > 0 else None,
+            "max_flow":max(flows) if len(flows) > 0 else None,
+            "wall_seconds":seconds, "output":output}
+
+def main(arguments):
+    parser = argparse.ArgumentParser(description = "Replay methods on simulated time")
+    parser.add_argument("methods", nargs = "+", help = "method config files, as for headless.py")
+    parser.add_argument("--log", default = None, help = "recorded text log to take the temperatures from")
+    parser.add_argument("--output-dir", default = None, help = "write each replayed run log here")
+    parser.add_argument("--log-level", choices = ["debug", "info", "warning", "error"], default = "warning",
+                        help = "event log messages shown on stderr")
+    args = parser.parse_args(arguments)
+    event_log.start(level = args.log_level)
+
+    recorded = None
+    if not args.log == None:
+        recorded = binary_log.readTXT(args.log)
+    if not args.output_dir == None:
+        os.makedirs(args.output_dir, exist_ok = True)
+    failures = 0
+    for path in args.methods:
+        output = None
+        if not args.output_dir == None:
+            output = os.path.join(args.output_dir, os.path.splitext(os.path.basename(path))[0] + ".txt")
+        begin = time.perf_counter()
+        try:
+            entries = replayMethod(headless.readMethod(path), recorded, output)
+        except (OSError, ValueError, SystemExit) as error:
+            failures += 1
+            print(json.dumps({"method":path, "error":str(error)}))
+            continue
+        print(json.dumps(summarize(path, entries, time.perf_counter() - begin, output)))
+    return failures
+
+if __name__ == "__main__":
+    sys.exit(1 if main(sys.argv[1:]) > 0 else 0)
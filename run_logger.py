@@ -0,0 +1,88 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+import application_helper
+import metrics
+
+class RunLogger:
+    def __init__(self, startTime, engine, flushInterval = 1.0, fsyncInterval = None, bufferSize = 65536, maxPending = 10000, suffix = ""):
+        # writes log entries to the run's .txt file every flushInterval seconds from a
+        # coroutine on an engine.Engine; the file is flushed every flushInterval seconds
+        # and also fsynced every fsyncInterval seconds (never when None)
+        self.path = application_helper.logFilename(startTime, suffix)
+        self.flushInterval = flushInterval
+        self.fsyncInterval = fsyncInterval
+        self.file = open(self.path, "w", buffering = bufferSize)
+        # bounded, so memory stays constant even if the disk falls behind; once it is half
+        # full it is drained without waiting for the interval, and once full entries are
+        # dropped and counted rather than holding up the control loop
+        self.queue = queue.Queue(maxPending)
+        self.drainAt = max(1, maxPending//2)
+        self.drainPending = False
+        self.entriesWritten = 0
+        self.entriesDropped = 0
+        self.lastFlush = time.monotonic()
+        self.lastSync = self.lastFlush
+        self.engine = engine
+        self.writeLock = threading.Lock()
+        self.future = engine.submit(self.flushAsync())
+
+    def append(self, entry):
+        # queues one [time, flow, temperatures] entry, never waiting
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            self.entriesDropped += 1
+            metrics.count("log_entries_dropped")
+        if not self.drainPending and self.queue.qsize() >= self.drainAt and not self.future == None:
+            self.drainPending = True
+            self.engine.submit(self.engine.fileIO(self.drain))
+
+    def close(self):
+        # writes whatever is still queued and closes the file
+        if not self.future == None:
+            # the flush coroutine is only waiting for its next interval, so it is cancelled
+            self.future.cancel()
+            self.future = None
+            begin = time.perf_counter()
+            with self.writeLock:
+                self.writeQueued()
+                self.flush(None)
+                self.file.close()
+            # the stall at the end of the run, the flushes during it are log_flush_seconds
+            metrics.observe("log_close_seconds", time.perf_counter() - begin)
+
+    async def flushAsync(self):
+        while True:
+            await asyncio.sleep(self.flushInterval)
+            await self.engine.fileIO(self.drain)
+
+    def drain(self):
+        # writes every queued entry without waiting for more
+        self.drainPending = False
+        with self.writeLock:
+            if not self.file.closed:
+                self.writeQueued()
+                self.flush(time.monotonic())
+
+    def writeQueued(self):
+        while True:
+            try:
+                entry = self.queue.get_nowait()
+            except queue.Empty:
+                return
+            self.file.write(application_helper.formatLogEntry(entry))
+            self.entriesWritten += 1
+
+    def flush(self, now):
+        # flushes (and fsyncs) when due, or unconditionally when now is None
+        if now == None or now - self.lastFlush >= self.flushInterval:
+            begin = time.perf_counter()
+            self.file.flush()
+            self.lastFlush = now
+            if not self.fsyncInterval == None and (now == None or now - self.lastSync >= self.fsyncInterval):
+                os.fsync(self.file.fileno())
+                self.lastSync = now
+            metrics.observe("log_flush_seconds", time.perf_counter() - begin)
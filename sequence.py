@@ -0,0 +1,159 @@
+import collections
+import threading
+import calibration
+import event_log
+import profiles
+
+# Autosampler sequences: an ordered list of runs, each with its own method, started one
+# after another on the trigger
+
+RunSpec = collections.namedtuple("RunSpec",
+    ["name", "mode", "profile", "interval", "maxTime", "coolingTemperature", "calibration", "flow"],
+    defaults = [None, 60, 3000, 999, None, 1.0])
+
+def runFromMethod(name, method):
+    # a RunSpec from a method read by headless.readMethod
+    return RunSpec(name, method["mode"], method["profile"], method["interval"], method["maxTime"],
+                   method["coolingTemperature"], method["calibration"], method["flow"])
+
+def prepareRun(run):
+    # loads and checks what the run needs before it is due, returns the profile array
+    # or calibration curve, raises OSError or ValueError (profiles.ProfileError) when it is unusable
+    if run.maxTime <= 0:
+        raise ValueError(str(run.name) + ": the GC runtime must be positive")
+    if run.mode == 1:
+        return profiles.loadProfile(run.profile)
+    if run.mode == 2 and not run.calibration == None:
+        return calibration.loadCalibration(run.calibration)
+    return None
+
+class SequenceRunner:
+    def __init__(self, app, runs):
+        # drives app through runs; each run's files are loaded while the one before it
+        # is still going, so the next run is armed the moment the oven has cooled
+        self.app = app
+        self.runs = list(runs)
+        self.index = None
+        self.prepared = {}
+        self.prefetchThread = None
+        self.lock = threading.Lock()
+        self.finished = False
+        self.errors = []
+        # trigger times of the runs made so far, and the timings of each hand-off
+        self.startTimes = []
+        self.armTime = None
+        self.lastEndTime = None
+        self.previous = None
+        self.transitions = []
+
+    def start(self):
+        # the first run is loaded now, so a bad sequence fails before anything is armed
+        self.app.sequence = self
+        self.prepare(0)
+        self.armNext(0)
+
+    def stop(self):
+        # the run in progress goes on, nothing further is armed
+        self.finished = True
+        if self.app.sequence == self:
+            self.app.sequence = None
+
+    def isFinished(self):
+        return self.finished
+
+# Loading ahead
+
+    def prepare(self, index):
+        # loads run index unless that has already been done; a run that fails is reported
+        # now, while there is still time to fix its file, and skipped when it is due
+        with self.lock:
+            if index in self.prepared:
+                return
+        try:
+            result = [prepareRun(self.runs[index]), None]
+        except (OSError, ValueError) as error:
+            result = [None, error]
+            event_log.warning("run will be skipped", run = self.runs[index].name, error = str(error))
+            self.errors.append({"run":self.runs[index].name, "error":str(error)})
+        with self.lock:
+            self.prepared[index] = result
+
+    def prefetch(self, index):
+        # reading and parsing a profile is file I/O, kept off the control loop
+        if index < len(self.runs):
+            self.prefetchThread = threading.Thread(target=self.prepare, args=(index,), daemon=True)
+            self.prefetchThread.start()
+
+    def waitForPrefetch(self):
+        if not self.prefetchThread == None:
+            self.prefetchThread.join()
+            self.prefetchThread = None
+
+# Hand-off between runs
+
+    def armNext(self, index):
+        # applies the first usable run from index on and arms the trigger for it
+        app = self.app
+        while index < len(self.runs):
+            self.prepare(index)
+            data, error = self.prepared.pop(index)
+            if error == None:
+                break
+            index += 1
+        if index >= len(self.runs):
+            self.stop()
+            return
+        self.index = index
+        run = self.runs[index]
+        app.setMode(run.mode)
+        app.setMaxTime(run.maxTime)
+        app.setCoolingTemperature(run.coolingTemperature)
+        if run.mode == 0:
+            app.setFlowRate(run.flow)
+        elif run.mode == 1:
+            app.setArray(data)
+            app.setTimeInterval(run.interval)
+        else:
+            if not data == None:
+                app.setCalibration(data)
+            app.setTimeInterval(10)
+        self.armTime = app.clock.time()
+        app.start(waitForTrigger = True, resetTime = True)
+
+    def runStarted(self):
+        # called by the application when the trigger begins a run
+        now = self.app.clock.time()
+        self.startTimes.append(now)
+        if not self.lastEndTime == None:
+            self.transitions.append({"from":self.runs[self.previous].name, "to":self.runs[self.index].name,
+                                     "cooling":self.armTime - self.lastEndTime,
+                                     "waiting":now - self.armTime,
+                                     "deadTime":now - self.lastEndTime})
+        self.prefetch(self.index + 1)
+
+    def runFinished(self):
+        # called by the application when the run is over and the oven has cooled
+        if self.finished:
+            return
+        endTime = self.app.runEndTime
+        self.lastEndTime = self.app.clock.time() if endTime == None else endTime
+        self.previous = self.index
+        self.waitForPrefetch()
+        self.armNext(self.index + 1)
+
+# Reporting
+
+    def samplesPerHour(self):
+        # injections per hour from the first trigger to the last one
+        if len(self.startTimes) < 2:
+            return None
+        return (len(self.startTimes) - 1)*3600.0/(self.startTimes[-1] - self.startTimes[0])
+
+    def getReport(self):
+        deadTimes = [transition["deadTime"] for transition in self.transitions]
+        return {"runs":len(self.runs), "started":len(self.startTimes),
+                "current":None if self.index == None else self.runs[self.index].name,
+                "finished":self.finished, "samplesPerHour":self.samplesPerHour(),
+                "timeToReady":self.app.getTimeToReady(),
+                "meanDeadTime":sum(deadTimes)/len(deadTimes) if len(deadTimes) > 0 else None,
+                "transitions":list(self.transitions), "errors":list(self.errors)}
@@ -0,0 +1,283 @@
+import math
+import random
+import threading
+import application_helper
+import channels
+import clocks
+
+# Simulated LabJack T7, usable anywhere the labjack.ljm module is
+
+class LJMError(Exception):
+    pass
+
+class Constants:
+    dtANY = 0
+    dtT7 = 7
+    ctANY = 0
+    ctUSB = 1
+    READ = 0
+    WRITE = 1
+
+class ThermalModel:
+    def __init__(self, ambient = 25.0, ovenStart = 40.0, ovenRate = 10.0/60, ovenMax = 300.0,
+                 coolingTau = 90.0, noise = 0.05):
+        # oven (AIN0) runs a heating program once triggered and decays to ambient while FIO2 cools it,
+        # the cold jet (AIN1) is chilled by the DAC0 flow, the hot jet (AIN2) sits above the oven
+        # and the 2nd oven (AIN3) lags behind the oven
+        self.ambient = ambient
+        self.ovenRate = ovenRate
+        self.ovenMax = ovenMax
+        self.coolingTau = coolingTau
+        self.noise = noise
+        self.temperatures = [ovenStart, ambient, ovenStart + 30, ovenStart]
+        self.flow = 0.0
+        self.cooling = False
+        self.heating = False
+
+    def step(self, dt):
+        if dt <= 0:
+            return
+        t = self.temperatures
+        if self.cooling:
+            t[0] = self.ambient + (t[0] - self.ambient)*math.exp(-dt/self.coolingTau)
+        elif self.heating:
+            t[0] = min(self.ovenMax, t[0] + self.ovenRate*dt)
+        t[1] = self.approach(t[1], self.ambient - 10*self.flow, dt, 5.0)
+        t[2] = self.approach(t[2], t[0] + 30, dt, 10.0)
+        t[3] = self.approach(t[3], t[0], dt, 20.0)
+
+    def approach(self, value, target, dt, tau):
+        # first order lag of value towards target
+        return target + (value - target)*math.exp(-dt/tau)
+
+    def read(self, channel):
+        return self.temperatures[channel] + random.gauss(0, self.noise)
+
+class SimulatedDevice:
+    def __init__(self, serialNumber, latency, jitter, model, clock = clocks.systemClock):
+        self.serialNumber = serialNumber
+        self.latency = latency
+        self.jitter = jitter
+        self.model = model
+        self.clock = clock
+        self.registers = {"FIO1":1}
+        self.lastStep = clock.monotonic()
+        self.triggerUntil = None
+        self.triggerTimes = []
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.stream = None
+        self.extendedFeatures = True
+        self.connected = True
+
+    def transact(self):
+        # one USB round trip: waits out the latency and advances the thermal model
+        if not self.connected:
+            raise LJMError("device " + str(self.serialNumber) + " is disconnected")
+        self.calls += 1
+        delay = self.latency + random.gauss(0, self.jitter) if self.jitter > 0 else self.latency
+        if delay > 0:
+            self.clock.sleep(delay)
+        self.advance()
+
+    def advance(self):
+        now = self.clock.monotonic()
+        self.model.step(now - self.lastStep)
+        self.lastStep = now
+        if len(self.triggerTimes) > 0 and now >= self.triggerTimes[0]:
+            self.triggerTimes.pop(0)
+            self.fireTrigger()
+
+    def fireTrigger(self, width = 0.5):
+        # the autosampler holds FIO1 low for width seconds and the oven program starts
+        self.triggerUntil = self.clock.monotonic() + width
+        self.model.heating = True
+
+    def read(self, name):
+        if name.startswith("AIN") and name[3:].isdigit():
+            return self.voltage(int(name[3:]))
+        if name.startswith("AIN") and name.endswith("_EF_READ_A") and name[3:-10].isdigit():
+            return self.readExtended(int(name[3:-10]))
+        if name == "FIO1":
+            if not self.triggerUntil == None and self.clock.monotonic() < self.triggerUntil:
+                return 0
+            return 1
+        return self.registers.get(name, 0)
+
+    def voltage(self, port):
+        # the thermocouple amplifier's output for the model temperature
+        spans = application_helper.temperatureSpans[port]
+        return application_helper.tempToVoltage(self.model.read(port), spans[0], spans[1])
+
+    def readExtended(self, port):
+        # AIN extended features: offset and slope applied to the voltage, or a
+        # thermocouple, for which the model temperature stands in
+        prefix = "AIN" + str(port) + "_EF_"
+        index = self.registers.get(prefix + "INDEX", 0)
+        if index == 1:
+            return self.registers.get(prefix + "CONFIG_D", 1.0)*self.voltage(port) + self.registers.get(prefix + "CONFIG_E", 0.0)
+        if index in channels.thermocoupleIndexes.values():
+            temp = self.model.read(port)
+            units = self.registers.get(prefix + "CONFIG_A", 0)
+            return temp + 273.15 if units == 0 else temp if units == 1 else temp*1.8 + 32
+        raise LJMError("AIN" + str(port) + " has no extended feature set up")
+
+    def write(self, name, value):
+        if name.startswith("AIN") and ("_EF_" in name or name.endswith("_RANGE")):
+            if not self.extendedFeatures:
+                raise LJMError("AIN extended features are not supported, cannot write " + name)
+            if name.endswith("_EF_INDEX"):
+                # a new feature starts from its default configuration
+                prefix = name[:-5]
+                for register in [register for register in self.registers if register.startswith(prefix + "CONFIG_")]:
+                    del self.registers[register]
+        self.registers[name] = value
+        if name == "DAC0":
+            self.model.flow = value*4.0
+        elif name == "FIO2":
+            self.model.cooling = value == 1
+            if self.model.cooling:
+                self.model.heating = False
+
+class SimulatedLJM:
+    LJMError = LJMError
+    constants = Constants
+
+    def __init__(self, devices = 1, latency = 0.001, jitter = 0.0002, firstSerial = 470010000, modelFactory = ThermalModel, clock = None,
+                 extendedFeatures = True):
+        # backend exposing the subset of the ljm API the application uses; with a
+        # clocks.SimulatedClock the device latency and the thermal model run on simulated time;
+        # without extendedFeatures the devices refuse the AIN extended feature registers
+        self.clock = clocks.systemClock if clock == None else clock
+        self.devices = [SimulatedDevice(firstSerial + n, latency, jitter, modelFactory(), self.clock) for n in range(devices)]
+        for device in self.devices:
+            device.extendedFeatures = extendedFeatures
+        self.handles = {}
+        self.nextHandle = 1000
+
+    def device(self, handle):
+        try:
+            return self.handles[handle]
+        except KeyError:
+            raise LJMError("invalid handle " + str(handle))
+
+    def scheduleTrigger(self, delay, handle = None):
+        # pulls FIO1 low delay seconds from now, on one device or all of them
+        devices = self.devices if handle == None else [self.device(handle)]
+        for device in devices:
+            device.triggerTimes.append(self.clock.monotonic() + delay)
+            device.triggerTimes.sort()
+
+    def callCount(self, handle):
+        return self.device(handle).calls
+
+    def disconnect(self, handle = None):
+        # unplugs one device or all of them: their handles stop working and they cannot
+        # be opened until reconnect
+        devices = self.devices if handle == None else [self.device(handle)]
+        for device in devices:
+            device.connected = False
+            device.stream = None
+            # a device that comes back has lost everything written to it
+            device.registers = {"FIO1":1}
+            device.model.flow = 0.0
+            device.model.cooling = False
+
+    def reconnect(self):
+        for device in self.devices:
+            device.connected = True
+
+# Device discovery and connections
+
+    def listAll(self, deviceType, connectionType):
+        serials = [device.serialNumber for device in self.devices if device.connected]
+        return len(serials), [Constants.dtT7]*len(serials), [Constants.ctUSB]*len(serials), serials, [0]*len(serials)
+
+    def open(self, deviceType, connectionType, identifier):
+        opened = self.handles.values()
+        for device in self.devices:
+            if device in opened or not device.connected:
+                continue
+            if identifier == "ANY" or str(identifier) == str(device.serialNumber):
+                handle = self.nextHandle
+                self.nextHandle += 1
+                self.handles[handle] = device
+                return handle
+        raise LJMError("no simulated device matching " + str(identifier))
+
+    def close(self, handle):
+        self.handles.pop(handle, None)
+
+# Register access
+
+    def eReadName(self, handle, name):
+        device = self.device(handle)
+        with device.lock:
+            device.transact()
+            return device.read(name)
+
+    def eWriteName(self, handle, name, value):
+        device = self.device(handle)
+        with device.lock:
+            device.transact()
+            device.write(name, value)
+
+    def eReadNames(self, handle, numFrames, names):
+        device = self.device(handle)
+        with device.lock:
+            device.transact()
+            return [device.read(name) for name in names]
+
+    def eWriteNames(self, handle, numFrames, names, values):
+        device = self.device(handle)
+        with device.lock:
+            device.transact()
+            for name, value in zip(names, values):
+                device.write(name, value)
+
+    def eNames(self, handle, numFrames, names, writes, numValues, values):
+        device = self.device(handle)
+        results = []
+        with device.lock:
+            device.transact()
+            for name, write, value in zip(names, writes, values):
+                if write == Constants.WRITE:
+                    device.write(name, value)
+                    results.append(value)
+                else:
+                    results.append(device.read(name))
+        return results
+
+# Stream mode
+
+    def namesToAddresses(self, numFrames, names):
+        # AIN addresses are two registers apart on the T7
+        return [int(name[3:])*2 for name in names], [3]*numFrames
+
+    def eStreamStart(self, handle, scansPerRead, numAddresses, scanList, scanRate):
+        device = self.device(handle)
+        device.stream = {"scansPerRead":scansPerRead, "channels":[address//2 for address in scanList],
+                         "scanRate":float(scanRate), "nextRead":self.clock.monotonic()}
+        return float(scanRate)
+
+    def eStreamRead(self, handle):
+        device = self.device(handle)
+        stream = device.stream
+        if stream == None:
+            raise LJMError("stream is not running")
+        # blocks until scansPerRead scans would have been acquired
+        stream["nextRead"] += stream["scansPerRead"]/stream["scanRate"]
+        wait = stream["nextRead"] - self.clock.monotonic()
+        if wait > 0:
+            self.clock.sleep(wait)
+        with device.lock:
+            device.advance()
+            spans = application_helper.temperatureSpans
+            data = []
+            for scan in range(stream["scansPerRead"]):
+                for channel in stream["channels"]:
+                    data.append(application_helper.tempToVoltage(device.model.read(channel), spans[channel][0], spans[channel][1]))
+        return data, 0, 0
+
+    def eStreamStop(self, handle):
+        self.device(handle).stream = None
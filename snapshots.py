@@ -0,0 +1,26 @@
+import collections
+
+# Immutable state published by the control loop for the GUI and other readers
+
+StateSnapshot = collections.namedtuple("StateSnapshot",
+    ["sequence", "modeNumber", "isRunning", "triggeredStart", "isArmed", "ovenIsCooling",
+     "flowRate", "temperatures", "timeElapsed", "timeToReady", "connected"])
+
+class LatestValue:
+    def __init__(self):
+        # single-slot channel: the publisher replaces the value and readers take the newest,
+        # so a slow reader coalesces any number of updates into one; rebinding an attribute
+        # is atomic, so neither side takes a lock
+        self.value = None
+        self.sequence = 0
+
+    def publish(self, value):
+        self.value = value
+
+    def latest(self):
+        return self.value
+
+    def nextSequence(self):
+        # only the publishing thread calls this
+        self.sequence += 1
+        return self.sequence
@@ -0,0 +1,130 @@
+import array
+import threading
+import application_helper
+import event_log
+
+# value LJM places in the stream data for scans the device had to skip
+SKIPPED_SAMPLE = -9999.0
+
+class SampleRing:
+    def __init__(self, capacity, channels):
+        # preallocated ring of scans, each scan holds one voltage per channel
+        self.capacity = capacity
+        self.channels = channels
+        self.data = array.array('d', bytes(8 * capacity * channels))
+        self.scansWritten = 0
+
+    def put(self, position, value):
+        # stores one sample at a flat position counted from the first scan
+        self.data[position % len(self.data)] = value
+
+    def latestScan(self):
+        # returns the voltages of the most recent complete scan
+        if self.scansWritten == 0:
+            return None
+        start = ((self.scansWritten - 1) % self.capacity) * self.channels
+        return [self.data[start + channel] for channel in range(self.channels)]
+
+    def lastScans(self, count):
+        # returns a copy of up to count of the most recent scans, oldest first
+        count = min(count, self.scansWritten, self.capacity)
+        first = self.scansWritten - count
+        return [[self.data[((first + n) % self.capacity) * self.channels + channel] for channel in range(self.channels)] for n in range(count)]
+
+class StreamAcquisition:
+    def __init__(self, handle, scanRate = 1000, controlRate = 1.0, bufferSeconds = 60, channels = 4):
+        # hardware-timed acquisition of AIN0 to AIN(channels-1)
+        self.handle = handle
+        self.backend = application_helper.backendFor(handle)
+        self.scanRate = scanRate
+        self.controlRate = controlRate
+        self.channels = channels
+        self.names = ["AIN" + str(port) for port in range(channels)]
+        self.ring = SampleRing(int(scanRate * bufferSeconds), channels)
+        self.decimatedVoltages = None
+        self.skippedSamples = 0
+        self.deviceBacklog = 0
+        self.ljmBacklog = 0
+        self.thread = None
+        self.stopEvent = threading.Event()
+        # device errors go to errorHandler(error, handle), when there is one
+        self.errorHandler = None
+        # the device's serial number, for the event log
+        self.serial = None
+
+    def start(self):
+        # eStreamRead returns ten times a second, whatever the scan rate
+        self.scansPerRead = max(1, int(self.scanRate / 10))
+        scanList = self.backend.namesToAddresses(self.channels, self.names)[0]
+        self.scanRate = self.backend.eStreamStart(self.handle, self.scansPerRead, self.channels, scanList, self.scanRate)
+        # the control loop consumes one averaged value per control period
+        self.decimation = max(1, int(round(self.scanRate / self.controlRate)))
+        self.sums = array.array('d', bytes(8 * self.channels))
+        self.scansInBlock = 0
+        self.stopEvent.clear()
+        application_helper.activeStreams[self.handle] = self
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def setControlRate(self, controlRate):
+        # the control loop's new sensing rate, taking effect from the block under way
+        self.controlRate = controlRate
+        self.decimation = max(1, int(round(self.scanRate / controlRate)))
+
+    def stop(self):
+        self.stopEvent.set()
+        if not self.thread == None:
+            self.thread.join()
+            self.thread = None
+        application_helper.activeStreams.pop(self.handle, None)
+        self.backend.eStreamStop(self.handle)
+
+    def run(self):
+        while not self.stopEvent.is_set():
+            try:
+                data, self.deviceBacklog, self.ljmBacklog = self.backend.eStreamRead(self.handle)
+            except self.backend.LJMError as error:
+                # the device has gone; the application restarts the stream once it is back
+                event_log.warning("stream stopped", serial = self.serial, error = str(error))
+                if not self.errorHandler == None:
+                    self.errorHandler(error, self.handle)
+                return
+            self.store(data)
+
+    def store(self, data):
+        # copies one eStreamRead block into the ring and updates the decimated values
+        ring = self.ring
+        sums = self.sums
+        channels = self.channels
+        position = ring.scansWritten * channels
+        for i in range(len(data)):
+            value = data[i]
+            channel = i % channels
+            if value == SKIPPED_SAMPLE:
+                # repeat the previous sample of this channel
+                self.skippedSamples += 1
+                value = ring.data[(position + i - channels) % len(ring.data)]
+            ring.put(position + i, value)
+            sums[channel] += value
+            if channel == channels - 1:
+                ring.scansWritten += 1
+                self.scansInBlock += 1
+                if self.scansInBlock >= self.decimation:
+                    # a new tuple is published once per control period; a block may run
+                    # past decimation when the control rate has just gone up
+                    self.decimatedVoltages = tuple(total / self.scansInBlock for total in sums)
+                    for n in range(channels):
+                        sums[n] = 0.0
+                    self.scansInBlock = 0
+
+    def getVoltages(self):
+        # decimated voltages, falling back to the latest scan before the first block completes
+        if self.decimatedVoltages == None:
+            return self.ring.latestScan()
+        return self.decimatedVoltages
+
+    def getTemperature(self):
+        voltages = self.getVoltages()
+        if voltages == None:
+            return [None for port in range(self.channels)]
+        return application_helper.voltagesToTemps(voltages, self.handle)
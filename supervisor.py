@@ -0,0 +1,142 @@
+import threading
+import time
+import application_helper
+import event_log
+import metrics
+
+class ConnectionSupervisor:
+    def __init__(self, app, interval = 1.0, minBackoff = 0.5, maxBackoff = 30.0):
+        # watches app's LabJack on a background thread: while connected it reads a register
+        # every interval seconds, as the control loop may not touch the device for a long
+        # time, and once the device is lost it reopens it, waiting minBackoff seconds after the
+        # first failed attempt and twice as long after each further one, up to maxBackoff.
+        # The control loop only reports errors here and never waits for a reconnect
+        self.app = app
+        self.interval = interval
+        self.minBackoff = minBackoff
+        self.maxBackoff = maxBackoff
+        self.lock = threading.Lock()
+        self.wakeEvent = threading.Event()
+        self.stopEvent = threading.Event()
+        self.thread = None
+        # the outage in progress, when there is one, and those that are over
+        self.outageStart = None
+        self.lastError = None
+        self.attempts = 0
+        self.outages = []
+        self.lostHandle = None
+        if app.handle == None:
+            # missing from the start
+            self.beginOutage("no LabJack found", None)
+
+    def start(self):
+        self.stopEvent.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopEvent.set()
+        self.wakeEvent.set()
+        if not self.thread == None:
+            self.thread.join()
+            self.thread = None
+
+    def isConnected(self):
+        return self.outageStart == None
+
+    def waitConnected(self, timeout = None):
+        # blocks until the device is connected, returns False on timeout
+        deadline = None if timeout == None else time.monotonic() + timeout
+        while not self.isConnected():
+            if self.stopEvent.is_set() or (not deadline == None and time.monotonic() >= deadline):
+                return False
+            time.sleep(0.05)
+        return True
+
+# Losing the device
+
+    def lost(self, error, handle):
+        # called from any thread when I/O on handle failed; returns at once. Errors from
+        # a handle that has since been replaced are ignored
+        with self.lock:
+            if not self.outageStart == None or not handle == self.app.handle:
+                return
+            self.beginOutage(error, handle)
+        self.wakeEvent.set()
+
+    def beginOutage(self, error, handle):
+        self.app.connected = False
+        self.outageStart = time.monotonic()
+        self.lastError = str(error)
+        self.attempts = 0
+        self.lostHandle = handle
+        metrics.count("device_outages")
+        event_log.warning("LabJack connection lost", serial = self.app.serial, error = str(error))
+
+    def endOutage(self):
+        duration = time.monotonic() - self.outageStart
+        self.outages.append({"start":time.time() - duration, "duration":duration, "error":self.lastError, "attempts":self.attempts})
+        metrics.observe("device_outage_seconds", duration)
+        event_log.info("LabJack reconnected", serial = self.app.serial, outage = duration, attempts = self.attempts)
+        self.outageStart = None
+
+# Supervision thread
+
+    def run(self):
+        backoff = self.minBackoff
+        wait = 0 if not self.isConnected() else self.interval
+        while not self.stopEvent.is_set():
+            self.wakeEvent.wait(wait)
+            self.wakeEvent.clear()
+            if self.stopEvent.is_set():
+                return
+            if self.isConnected():
+                self.check()
+                backoff = self.minBackoff
+                wait = self.interval
+            elif self.reconnect():
+                wait = self.interval
+            else:
+                wait = backoff
+                backoff = min(self.maxBackoff, backoff*2)
+
+    def check(self):
+        # a register that is only ever read, so the check cannot disturb the device
+        handle = self.app.handle
+        try:
+            application_helper.eReadName(handle, "SERIAL_NUMBER")
+        except self.app.deviceError as error:
+            self.lost(error, handle)
+
+    def reconnect(self):
+        # one attempt: the old handle is let go, the device opened again and the state the
+        # application last set is written to it before the control loop may use it
+        app = self.app
+        self.attempts += 1
+        if not self.lostHandle == None:
+            try:
+                application_helper.closeHandle(self.lostHandle)
+            except app.deviceError:
+                pass
+            self.lostHandle = None
+        handle = application_helper.openHandle(app.backend, "ANY" if app.serial == None else app.serial)
+        if handle == None:
+            return False
+        try:
+            app.restoreState(handle)
+        except app.deviceError as error:
+            self.lastError = str(error)
+            self.lostHandle = handle
+            return False
+        with self.lock:
+            app.connected = True
+            self.endOutage()
+        return True
+
+    def getStats(self):
+        outage = self.outageStart
+        durations = [entry["duration"] for entry in self.outages]
+        return {"connected":outage == None, "outages":len(self.outages) + (0 if outage == None else 1),
+                "outageSeconds":sum(durations) + (0.0 if outage == None else time.monotonic() - outage),
+                "currentOutage":None if outage == None else time.monotonic() - outage,
+                "attempts":self.attempts, "lastError":self.lastError, "history":list(self.outages)}
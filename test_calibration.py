@@ -0,0 +1,29 @@
+import calibration
+import mode_classes
+
+# Calibration curves of FlowVsTemp
+#
+#   python -m pytest test_calibration.py
+
+def oldTempToFlow(temp, offset):
+    # the formula FlowVsTemp used before calibration curves
+    if temp > 60:
+        return (-4.366E-7*(temp**3))+(4.625E-4*(temp**2))-(0.1678*temp)+22.69+(offset)
+    return 15
+
+def test_defaultCurveMatchesOldFormula():
+    mode = mode_classes.FlowVsTemp()
+    for n in range(-500, 5000):
+        temp = n*0.1 + 0.03
+        assert abs(mode.tempToFlow(temp) - oldTempToFlow(temp, 0.5)) < 1e-6, temp
+
+def test_arrayEvaluationMatchesScalar():
+    curve = calibration.defaultCurve(0.5)
+    temps = [20.0, 60.0, 60.05, 123.4, 300.0, 449.99, 460.0]
+    for flow, temp in zip(curve.tempToFlowArray(temps), temps):
+        assert abs(flow - curve.tempToFlow(temp)) < 1e-9, temp
+
+if __name__ == "__main__":
+    test_defaultCurveMatchesOldFormula()
+    test_arrayEvaluationMatchesScalar()
+    print("ok")
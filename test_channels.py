@@ -0,0 +1,44 @@
+import application_helper
+import channels
+import simulated_t7
+
+# Setting up temperature channels on the T7, and falling back to the host
+#
+#   python -m pytest test_channels.py
+
+def thermocoupleSet():
+    return channels.ChannelSet([channels.thermocoupleChannel(0, "K")] + channels.defaultChannels()[1:])
+
+def test_refusedFallsBackOnACopy():
+    backend = simulated_t7.SimulatedLJM(latency = 0, jitter = 0, extendedFeatures = False)
+    handle = application_helper.openHandle(backend)
+    channelSet = thermocoupleSet()
+    try:
+        assert not application_helper.configureChannels(handle, channelSet)
+        assert not application_helper.channelsFor(handle).onDevice()
+        # the set itself still asks for device conversion, for the next device or reconnect
+        assert channelSet.onDevice()
+    finally:
+        application_helper.closeHandle(handle)
+
+def test_lostDeviceIsRaised():
+    backend = simulated_t7.SimulatedLJM(latency = 0, jitter = 0)
+    handle = application_helper.openHandle(backend)
+    channelSet = thermocoupleSet()
+    try:
+        backend.devices[0].connected = False
+        try:
+            application_helper.configureChannels(handle, channelSet)
+            assert False, "the lost device should have been reported"
+        except simulated_t7.LJMError:
+            pass
+        assert channelSet.onDevice()
+        backend.devices[0].connected = True
+        assert application_helper.configureChannels(handle, channelSet)
+    finally:
+        application_helper.closeHandle(handle)
+
+if __name__ == "__main__":
+    test_refusedFallsBackOnACopy()
+    test_lostDeviceIsRaised()
+    print("ok")
@@ -0,0 +1,74 @@
+import math
+import os
+import random
+import tempfile
+import cooling_model
+import simulated_t7
+
+# Oven cooling estimate
+#
+#   python -m pytest test_cooling_model.py
+
+def writeLog(path, times, temps):
+    # a text run log as the application writes it, time in minutes
+    with open(path, "w") as file:
+        for t, temp in zip(times, temps):
+            file.write("\t".join(str(value) for value in [t/60.0, 1.0, temp, temp, temp, temp]) + "\n")
+
+def test_plateauIsNotCooling():
+    # a run log ends with the run, at the oven's final temperature
+    random.seed(1)
+    times = [n*0.5 for n in range(1200)]
+    temps = [min(300.0, 40.0 + t) + random.gauss(0, 0.05) for t in times]
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "2026-01-01_00-00-00.txt")
+    try:
+        writeLog(path, times, temps)
+        assert cooling_model.fitLog(path) == None
+        assert cooling_model.priorFromLogs([path]) == None
+    finally:
+        os.remove(path)
+        os.rmdir(directory)
+
+def test_loggedCoolingIsFitted():
+    tau, ambient = 200.0, 25.0
+    times = [n*0.5 for n in range(2000)]
+    temps = [300.0 if t < 60 else ambient + (300.0 - ambient)*math.exp(-(t - 60)/tau) for t in times]
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "2026-01-01_00-00-00.txt")
+    try:
+        writeLog(path, times, temps)
+        fit = cooling_model.fitLog(path)
+        assert abs(fit[0] - tau) < 0.05*tau
+        assert abs(fit[1] - ambient) < 5.0
+    finally:
+        os.remove(path)
+        os.rmdir(directory)
+
+def test_predictionsOnSimulatedCooling():
+    # the simulator's oven cools with a 90 s time constant and the 2nd oven lags it by 20 s
+    random.seed(4)
+    oven = simulated_t7.ThermalModel()
+    oven.temperatures = [300.0, 25.0, 330.0, 300.0]
+    oven.cooling = True
+    model = cooling_model.CoolingModel()
+    t = 0.0
+    model.begin(t, oven.read(3))
+    predictions = []
+    while oven.temperatures[3] > 60.0:
+        t += 0.5
+        oven.step(0.5)
+        model.add(t, oven.read(3))
+        predictions.append((t, model.timeToReach(60.0)))
+    # scored from 60% of the way through, while there are at least 20 s left
+    errors = [abs(predicted - (t - made))/(t - made) for made, predicted in predictions if made >= 0.6*t and t - made >= 20.0]
+    # about 20%, a little more depending on the noise
+    assert all(error < 0.25 for error in errors)
+    # and they improve as the cooling goes on
+    assert errors[-1] < errors[0]
+
+if __name__ == "__main__":
+    test_plateauIsNotCooling()
+    test_loggedCoolingIsFitted()
+    test_predictionsOnSimulatedCooling()
+    print("ok")
@@ -0,0 +1,55 @@
+import random
+import history
+
+# Windowed statistics of the tick history, checked against the window recomputed by brute force
+#
+#   python -m pytest test_history.py
+
+def bruteForce(times, values):
+    # min, max, mean and least squares slope of the known values
+    known = [(t, value) for t, value in zip(times, values) if not value == None]
+    if len(known) == 0:
+        return None, None, None, None
+    n = len(known)
+    mean = sum(value for t, value in known)/n
+    slope = None
+    if n >= 2:
+        meanT = sum(t for t, value in known)/n
+        spread = sum((t - meanT)**2 for t, value in known)
+        if spread > 0:
+            slope = sum((t - meanT)*(value - mean) for t, value in known)/spread
+    return min(value for t, value in known), max(value for t, value in known), mean, slope
+
+def close(a, b):
+    if a == None or b == None:
+        return a == b
+    return abs(a - b) <= 1e-6*max(1.0, abs(b))
+
+def test_windowsMatchBruteForce():
+    random.seed(2)
+    # the ring wraps around many times and the sums are rebuilt every 2 windows
+    samples = history.History(capacity = 50, window = 20, recomputeEvery = 2)
+    times = []
+    flows = []
+    temps = []
+    t = 1000.0
+    for n in range(400):
+        t += random.uniform(0.5, 1.5)
+        flow = random.uniform(0, 10)
+        # unknown temperatures, alone and in gaps longer than the window
+        temp = None if random.random() < 0.1 or 200 <= n < 225 else 20 + n*0.5 + random.gauss(0, 2)
+        samples.append(t, flow, [temp, 1.0, 2.0, 3.0])
+        times.append(t)
+        flows.append(flow)
+        temps.append(temp)
+        window = slice(max(0, len(times) - 20), len(times))
+        for name, values in (("flow", flows), ("temp0", temps)):
+            expected = bruteForce(times[window], values[window])
+            found = (samples.min(name), samples.max(name), samples.mean(name), samples.slope(name))
+            assert all(close(a, b) for a, b in zip(found, expected)), (n, name, found, expected)
+    assert len(samples) == 50
+    assert list(samples.column("flow")) == flows[-50:]
+
+if __name__ == "__main__":
+    test_windowsMatchBruteForce()
+    print("ok")
@@ -0,0 +1,81 @@
+import random
+import application
+import mode_classes
+import simulated_t7
+
+# Setpoint schedules of FlowVsTime
+#
+#   python -m pytest test_mode_classes.py
+
+def bruteForce(times, flows, interpolation, t):
+    # the setpoint at t by scanning every breakpoint
+    if t < times[0]:
+        return flows[0]
+    n = max(n for n in range(len(times)) if times[n] <= t)
+    if n == len(times) - 1 or interpolation == "step":
+        return flows[n]
+    return flows[n] + (flows[n+1] - flows[n])*(t - times[n])/(times[n+1] - times[n])
+
+def test_arrayKeepsFixedSteps():
+    mode = mode_classes.FlowVsTime([1.0, 2.0, 3.0], 60)
+    assert mode.getFlowRate(0, None) == 1.0
+    assert mode.getFlowRate(59.9, None) == 1.0
+    assert mode.getFlowRate(60, None) == 2.0
+    assert mode.getFlowRate(150, None) == 3.0
+    # the last value is held past the end
+    assert mode.getFlowRate(10000, None) == 3.0
+
+def test_breakpointsMatchBruteForce():
+    random.seed(3)
+    times = [0.0]
+    for n in range(40):
+        times.append(times[-1] + random.uniform(0.5, 30))
+    flows = [random.uniform(0, 20) for t in times]
+    for interpolation in ("step", "linear"):
+        schedule = mode_classes.SetpointSchedule(times, flows, interpolation)
+        # advancing steadily, then jumping about, so both the cursor and bisection are used
+        points = [n*0.7 for n in range(int(times[-1]/0.7) + 20)] + [random.uniform(-10, times[-1] + 10) for n in range(500)]
+        for t in points:
+            assert abs(schedule.valueAt(t) - bruteForce(times, flows, interpolation, t)) < 1e-9, (interpolation, t)
+
+def test_precomputedTableMatchesEvaluation():
+    times = [0.0, 10.0, 25.0, 70.0]
+    flows = [2.0, 8.0, 4.0, 6.0]
+    schedule = mode_classes.SetpointSchedule(times, flows, "linear")
+    table = schedule.precompute(0.01, 100)
+    for n in range(0, len(table), 7):
+        assert abs(table[n] - bruteForce(times, flows, "linear", n*0.01)) < 1e-9
+        assert schedule.valueAt(n*0.01) == table[n]
+
+def test_invalidBreakpoints():
+    for times, flows, interpolation in (([0, 0], [1, 2], "step"), ([0, 1], [1], "step"), ([0], [1], "cubic"), ([], [], "step")):
+        try:
+            mode_classes.SetpointSchedule(times, flows, interpolation)
+            assert False, (times, flows, interpolation)
+        except ValueError:
+            pass
+
+def test_runStartBuildsTheTable():
+    app = application.Application(1, backend = simulated_t7.SimulatedLJM(latency = 0, jitter = 0), stepped = True)
+    try:
+        app.setArray([1.0, 2.0, 3.0])
+        app.setTimeInterval(60)
+        app.setMaxTime(600)
+        app.setControlRate(10)
+        app.start(waitForTrigger = False, resetTime = True)
+        schedule = app.modeClass.schedule
+        assert schedule.tablePeriod == 0.1 and len(schedule.table) == 6001
+        app.setControlRate(20, setpointEvery = 2)
+        assert schedule.tablePeriod == 0.1
+        app.setControlRate(50)
+        assert schedule.tablePeriod == 0.02 and schedule.valueAt(61.0) == 2.0
+    finally:
+        app.shutdown()
+
+if __name__ == "__main__":
+    test_arrayKeepsFixedSteps()
+    test_breakpointsMatchBruteForce()
+    test_precomputedTableMatchesEvaluation()
+    test_invalidBreakpoints()
+    test_runStartBuildsTheTable()
+    print("ok")
@@ -0,0 +1,47 @@
+import os
+import tempfile
+import profiles
+
+# Binary profiles: rewriting a profile that is mapped leaves the mapping intact
+#
+#   python -m pytest test_profiles.py
+
+def test_rewriteMappedProfile():
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "profile.bin")
+    try:
+        profiles.writeBinaryProfile(path, [1.0]*1000)
+        old = profiles.loadProfile(path)
+        # shorter than before, which truncating the mapped file in place would fault on
+        profiles.writeBinaryProfile(path, [2.0, 3.0])
+        assert sum(old) == 1000.0
+        new = profiles.loadProfile(path)
+        assert list(new) == [2.0, 3.0]
+        assert not os.path.exists(path + ".tmp")
+    finally:
+        profiles.clearCache()
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+def test_tighterLimitsAreChecked():
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "profile.txt")
+    try:
+        with open(path, "w") as file:
+            file.write("5\n15\n")
+        assert list(profiles.loadProfile(path, [0, 20])) == [5.0, 15.0]
+        try:
+            profiles.loadProfile(path, [0, 10])
+            assert False, "15 is outside 0-10"
+        except profiles.ProfileError:
+            pass
+    finally:
+        profiles.clearCache()
+        os.remove(path)
+        os.rmdir(directory)
+
+if __name__ == "__main__":
+    test_rewriteMappedProfile()
+    test_tighterLimitsAreChecked()
+    print("ok")
@@ -0,0 +1,105 @@
+import application_helper
+import channels
+import simulated_t7
+
+# Register shadow: redundant writes are left out, but never ones the device needs
+#
+#   python -m pytest test_shadow.py
+
+def tracedHandle():
+    # a simulated device whose eWriteNames calls are recorded
+    backend = simulated_t7.SimulatedLJM(latency = 0, jitter = 0)
+    handle = application_helper.openHandle(backend)
+    writes = []
+    eWriteNames = backend.eWriteNames
+    def traced(handle, numFrames, names, values):
+        writes.append(list(zip(names, values)))
+        eWriteNames(handle, numFrames, names, values)
+    backend.eWriteNames = traced
+    return handle, writes
+
+def stopPulse(handle):
+    application_helper.eWriteNames(handle, ["DIO0_EF_ENABLE", "FIO0"], [0, 0])
+
+def test_pulseStopAlwaysDrivesFIO0Low():
+    handle, writes = tracedHandle()
+    try:
+        for n in range(2):
+            application_helper.eWriteNames(handle, ["DIO0_EF_ENABLE", "DIO0_EF_VALUE_A", "DIO0_EF_ENABLE"], [0, 100, 1])
+            stopPulse(handle)
+            assert ("FIO0", 0) in writes[-1]
+        # stopping what is already stopped needs nothing
+        count = len(writes)
+        stopPulse(handle)
+        assert len(writes) == count
+    finally:
+        application_helper.closeHandle(handle)
+
+def test_failedBatchIsNotShadowed():
+    handle, writes = tracedHandle()
+    backend = application_helper.backendFor(handle)
+    try:
+        backend.devices[0].connected = False
+        try:
+            application_helper.eWriteNames(handle, ["DAC0", "FIO2"], [1.0, 1])
+            assert False, "the write should have failed"
+        except simulated_t7.LJMError:
+            pass
+        backend.devices[0].connected = True
+        application_helper.eWriteNames(handle, ["DAC0", "FIO2"], [1.0, 1])
+        assert writes[-1] == [("DAC0", 1.0), ("FIO2", 1)]
+        assert backend.devices[0].registers["FIO2"] == 1
+    finally:
+        application_helper.closeHandle(handle)
+
+def test_redundantWritesAreLeftOut():
+    handle, writes = tracedHandle()
+    try:
+        application_helper.eWriteName(handle, "DAC0", 0.5)
+        application_helper.eWriteNames(handle, ["DAC0", "FIO2"], [0.5, 1])
+        assert writes[-1] == [("FIO2", 1)]
+    finally:
+        application_helper.closeHandle(handle)
+
+def test_deadbandsAndStatsArePerDevice():
+    backend = simulated_t7.SimulatedLJM(2, latency = 0, jitter = 0)
+    first = application_helper.openHandle(backend, backend.devices[0].serialNumber)
+    second = application_helper.openHandle(backend, backend.devices[1].serialNumber)
+    try:
+        application_helper.setDeadband(first, "DAC0", 0.5)
+        for handle in (first, second):
+            application_helper.eWriteName(handle, "DAC0", 1.0)
+            application_helper.eWriteName(handle, "DAC0", 1.2)
+        assert backend.devices[0].registers["DAC0"] == 1.0
+        assert backend.devices[1].registers["DAC0"] == 1.2
+        assert application_helper.getShadowStats(first) == {"hits":1, "misses":1}
+        assert application_helper.getShadowStats(second) == {"hits":0, "misses":2}
+        assert application_helper.getIOStats(first)["transactions"] == 1
+    finally:
+        application_helper.closeHandle(first)
+        application_helper.closeHandle(second)
+
+def test_thermocoupleTypeChange():
+    # writing AIN0_EF_INDEX resets the channel's configuration, which has to be written again
+    handle, writes = tracedHandle()
+    backend = application_helper.backendFor(handle)
+    try:
+        for thermocouple in ("K", "J"):
+            channelSet = channels.ChannelSet([channels.thermocoupleChannel(0, thermocouple)] + channels.defaultChannels()[1:])
+            assert application_helper.configureChannels(handle, channelSet)
+        registers = backend.devices[0].registers
+        assert registers["AIN0_EF_INDEX"] == channels.thermocoupleIndexes["J"]
+        assert registers["AIN0_EF_CONFIG_A"] == channels.CELSIUS
+        assert registers["AIN0_EF_CONFIG_B"] == channels.CJC_ADDRESS
+        temperature = application_helper.getTemperature(handle)[0]
+        assert abs(temperature - backend.devices[0].model.temperatures[0]) < 1.0
+    finally:
+        application_helper.closeHandle(handle)
+
+if __name__ == "__main__":
+    test_pulseStopAlwaysDrivesFIO0Low()
+    test_failedBatchIsNotShadowed()
+    test_redundantWritesAreLeftOut()
+    test_deadbandsAndStatsArePerDevice()
+    test_thermocoupleTypeChange()
+    print("ok")
@@ -0,0 +1,68 @@
+import time
+import application
+import simulated_t7
+
+# Connection supervision against the simulated T7, on real time with short intervals
+#
+#   python -m pytest test_supervisor.py
+
+def waitFor(condition, timeout = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+def test_missingAtStartup():
+    # a device that appears after the application was made is connected and controlled
+    backend = simulated_t7.SimulatedLJM(latency = 0, jitter = 0)
+    backend.disconnect()
+    app = application.Application(0, backend = backend)
+    try:
+        assert app.handle == None
+        assert app.getTemperature(0) == None
+        app.setControlRate(20)
+        app.startSupervisor(interval = 0.05, maxBackoff = 0.1)
+        backend.reconnect()
+        assert app.supervisor.waitConnected(5)
+        assert app.loop.isRunning()
+        app.setFlowRate(4.0)
+        app.start()
+        assert waitFor(lambda: app.loop.ticks > 5 and not app.getSnapshot() == None)
+        assert app.loop.errors == 0
+        assert app.getTemperature(0) > 0
+        assert waitFor(lambda: backend.devices[0].registers.get("DAC0") == 1.0)
+        assert app.getConnectionStats()["outages"] == 1
+    finally:
+        app.shutdown()
+
+def test_reconnectRestoresState():
+    backend = simulated_t7.SimulatedLJM(latency = 0, jitter = 0)
+    app = application.Application(0, backend = backend)
+    try:
+        app.setControlRate(20)
+        app.setFlowRate(2.0)
+        app.start()
+        app.start_pulse()
+        app.startSupervisor(interval = 0.05, maxBackoff = 0.1)
+        assert waitFor(lambda: app.loop.ticks > 2)
+        backend.disconnect()
+        assert waitFor(lambda: not app.isConnected())
+        ticks = app.loop.ticks
+        assert waitFor(lambda: app.loop.ticks > ticks + 2)
+        backend.reconnect()
+        assert app.supervisor.waitConnected(5)
+        registers = backend.devices[0].registers
+        assert registers.get("DAC0") == 0.5
+        assert registers.get("DIO0_EF_ENABLE") == 1
+        assert app.loop.errors == 0
+        stats = app.getConnectionStats()
+        assert stats["outages"] == 1 and stats["currentOutage"] == None
+    finally:
+        app.shutdown()
+
+if __name__ == "__main__":
+    test_missingAtStartup()
+    test_reconnectRestoresState()
+    print("ok")
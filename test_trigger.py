@@ -0,0 +1,53 @@
+import time
+import application
+import simulated_t7
+
+# Trigger watching: re-arming or stopping from the GUI leaves no stray watch behind
+#
+#   python -m pytest test_trigger.py
+
+def countedApplication():
+    app = application.Application(1, backend = simulated_t7.SimulatedLJM(latency = 0, jitter = 0))
+    app.setArray([2.0]*10)
+    app.setTimeInterval(60)
+    starts = []
+    beginRun = app.beginRun
+    def counted(triggered, resetTime):
+        starts.append(triggered)
+        beginRun(triggered, resetTime)
+    app.beginRun = counted
+    return app, starts
+
+def fireTrigger(app):
+    # the autosampler pulls FIO1 low, long enough for any watch still polling to see it
+    app.backend.devices[0].fireTrigger()
+    time.sleep(0.3)
+
+def test_armTwiceStartsOnce():
+    app, starts = countedApplication()
+    try:
+        # pressing "Wait for trigger" twice
+        app.submit(app.start, True, True).result()
+        app.submit(app.start, True, True).result()
+        time.sleep(0.2)
+        fireTrigger(app)
+        assert starts == [True]
+    finally:
+        app.shutdown()
+
+def test_stopBeforeTrigger():
+    app, starts = countedApplication()
+    try:
+        app.submit(app.start, True, True).result()
+        time.sleep(0.1)
+        app.submit(app.stopRun).result()
+        fireTrigger(app)
+        assert starts == []
+        assert not app.trigger.isArmed()
+    finally:
+        app.shutdown()
+
+if __name__ == "__main__":
+    test_armTwiceStartsOnce()
+    test_stopBeforeTrigger()
+    print("ok")
@@ -0,0 +1,212 @@
+import array
+import math
+import time
+import tkinter as tk
+
+# Live trend of the temperatures and the flow rate, drawn on a Tk canvas from a
+# bounded, min/max decimated history
+
+class MinMaxHistory:
+    def __init__(self, capacity = 300):
+        # at most capacity buckets, each holding the first time and the lowest and highest
+        # value of span consecutive samples; when full, neighbouring buckets are merged and
+        # span doubles, so memory and the number of points drawn never grow
+        self.capacity = capacity - capacity % 2
+        self.times = array.array('d')
+        self.lows = array.array('d')
+        self.highs = array.array('d')
+        self.span = 1
+        self.filled = 0
+        # changes whenever a bucket other than the last one changes
+        self.version = 0
+
+    def __len__(self):
+        return len(self.times)
+
+    def append(self, t, value):
+        if value == None or math.isnan(value):
+            return
+        if len(self.times) == 0 or self.filled >= self.span:
+            if len(self.times) >= self.capacity:
+                self.compact()
+            self.times.append(t)
+            self.lows.append(value)
+            self.highs.append(value)
+            self.filled = 1
+            # the bucket before this one is complete now
+            self.version += 1
+        else:
+            if value < self.lows[-1]:
+                self.lows[-1] = value
+            if value > self.highs[-1]:
+                self.highs[-1] = value
+            self.filled += 1
+
+    def compact(self):
+        # merges pairs of buckets; with an even capacity the last merged bucket is complete
+        half = len(self.times)//2
+        for n in range(half):
+            self.times[n] = self.times[2*n]
+            self.lows[n] = min(self.lows[2*n], self.lows[2*n + 1])
+            self.highs[n] = max(self.highs[2*n], self.highs[2*n + 1])
+        del self.times[half:]
+        del self.lows[half:]
+        del self.highs[half:]
+        self.span *= 2
+        self.filled = self.span
+        self.version += 1
+
+    def clear(self):
+        del self.times[:]
+        del self.lows[:]
+        del self.highs[:]
+        self.span = 1
+        self.filled = 0
+        self.version += 1
+
+    def coordinates(self, first, last, toX, toY):
+        # flat canvas coordinates of buckets first to last - 1, each drawn as its low then
+        # its high value so the line covers the whole range the bucket saw
+        coords = []
+        for n in range(first, last):
+            x = toX(self.times[n])
+            coords += [x, toY(self.lows[n])]
+            if not self.highs[n] == self.lows[n]:
+                coords += [x, toY(self.highs[n])]
+        return coords
+
+def niceRange(low, high, step):
+    # the range rounded outwards to whole steps, never empty
+    low = math.floor(low/step)*step
+    high = math.ceil(high/step)*step
+    if high <= low:
+        high = low + step
+    return [low, high]
+
+class Series:
+    def __init__(self, name, color, axis, capacity):
+        self.name = name
+        self.color = color
+        self.axis = axis
+        self.history = MinMaxHistory(capacity)
+        self.settledItem = None
+        self.tailItem = None
+        self.drawnVersion = None
+
+class TrendPlot:
+    def __init__(self, parent, width = 780, height = 180, capacity = 300, minimumWindow = 60.0):
+        # left axis in °C for the temperatures, right axis in L/min for the flow rate
+        self.width = width
+        self.height = height
+        self.margin = [45, 10, 45, 20]
+        self.minimumWindow = minimumWindow
+        self.canvas = tk.Canvas(parent, width=width, height=height, bg="white", highlightthickness=0)
+        self.series = [Series("Oven", "red", "left", capacity),
+                       Series("Cold jet", "blue", "left", capacity),
+                       Series("Hot jet", "orange", "left", capacity),
+                       Series("2nd oven", "purple", "left", capacity),
+                       Series("Flow", "green", "right", capacity)]
+        self.steps = {"left":50.0, "right":1.0}
+        self.ranges = {"left":None, "right":None}
+        self.start = None
+        self.window = minimumWindow
+        self.axesChanged = True
+        self.axisText = {}
+        self.drawFrame()
+
+    def place(self, **options):
+        self.canvas.place(**options)
+
+# Data
+
+    def add(self, values, t = None):
+        # values are the four temperatures and the flow rate, None where unknown
+        if t == None:
+            t = time.monotonic()
+        if self.start == None:
+            self.start = t
+        t -= self.start
+        for series, value in zip(self.series, values):
+            series.history.append(t, value)
+            if not value == None:
+                self.extendRange(series.axis, value)
+        while t > self.window:
+            # the time axis doubles, so the drawn points only move now and then
+            self.window *= 2
+            self.axesChanged = True
+
+    def extendRange(self, axis, value):
+        current = self.ranges[axis]
+        if current == None:
+            self.ranges[axis] = niceRange(value, value, self.steps[axis])
+            self.axesChanged = True
+        elif value < current[0] or value > current[1]:
+            self.ranges[axis] = niceRange(min(value, current[0]), max(value, current[1]), self.steps[axis])
+            self.axesChanged = True
+
+    def clear(self):
+        for series in self.series:
+            series.history.clear()
+        self.start = None
+        self.window = self.minimumWindow
+        self.ranges = {"left":None, "right":None}
+        self.axesChanged = True
+
+# Drawing
+
+    def drawFrame(self):
+        left, top, right, bottom = self.margin
+        self.canvas.create_rectangle(left, top, self.width - right, self.height - bottom, outline="gray")
+        for name in ["leftHigh", "leftLow", "rightHigh", "rightLow", "window"]:
+            self.axisText[name] = self.canvas.create_text(0, 0, text="", font="Helvetica 7", fill="gray")
+        self.canvas.coords(self.axisText["leftHigh"], left - 20, top + 5)
+        self.canvas.coords(self.axisText["leftLow"], left - 20, self.height - bottom - 5)
+        self.canvas.coords(self.axisText["rightHigh"], self.width - right + 20, top + 5)
+        self.canvas.coords(self.axisText["rightLow"], self.width - right + 20, self.height - bottom - 5)
+        self.canvas.coords(self.axisText["window"], self.width - right - 30, self.height - bottom + 10)
+        x = left + 5
+        for series in self.series:
+            self.canvas.create_text(x, self.height - bottom + 10, text=series.name, fill=series.color, font="Helvetica 7", anchor="w")
+            x += 70
+            series.settledItem = self.canvas.create_line(0, 0, 0, 0, fill=series.color)
+            series.tailItem = self.canvas.create_line(0, 0, 0, 0, fill=series.color)
+
+    def toX(self, t):
+        left, top, right, bottom = self.margin
+        return left + t/self.window*(self.width - left - right)
+
+    def scaleY(self, axis):
+        low, high = self.ranges[axis] or [0.0, 1.0]
+        top = self.margin[1]
+        bottom = self.height - self.margin[3]
+        scale = (bottom - top)/(high - low)
+        return lambda value: bottom - (value - low)*scale
+
+    def redraw(self):
+        # the complete buckets are only redrawn when they or the axes change, the newest
+        # bucket every time; either way no more than capacity buckets per series are drawn
+        if self.axesChanged:
+            self.drawAxes()
+        for series in self.series:
+            history = series.history
+            toY = self.scaleY(series.axis)
+            settled = max(0, len(history) - 1)
+            if self.axesChanged or not series.drawnVersion == history.version:
+                self.setLine(series.settledItem, history.coordinates(0, settled, self.toX, toY))
+                series.drawnVersion = history.version
+            # the newest bucket is joined to the last complete one
+            self.setLine(series.tailItem, history.coordinates(max(0, settled - 1), len(history), self.toX, toY))
+        self.axesChanged = False
+
+    def setLine(self, item, coords):
+        # a canvas line needs two points at least
+        if len(coords) < 4:
+            coords = (coords + coords + [0, 0, 0, 0])[:4]
+        self.canvas.coords(item, *coords)
+
+    def drawAxes(self):
+        for axis, unit in [("left", " °C"), ("right", " L/min")]:
+            low, high = self.ranges[axis] or ["", ""]
+            self.canvas.itemconfig(self.axisText[axis + "High"], text=("%g" % high if not high == "" else "") + unit)
+            self.canvas.itemconfig(self.axisText[axis + "Low"], text=("%g" % low if not low == "" else "") + unit)
+        self.canvas.itemconfig(self.axisText["window"], text=str(round(self.window/60.0, 1)) + " min")
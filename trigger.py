@@ -0,0 +1,123 @@
+import asyncio
+import threading
+import time
+import application_helper
+import metrics
+
+class TriggerWatcher:
+    def __init__(self, handle, engine, name = "FIO1", fastInterval = 0.002, slowInterval = 0.05, leadTime = 5.0):
+        # watches for the autosampler pulling the trigger line low, as a coroutine on an
+        # engine.Engine
+        self.handle = handle
+        self.engine = engine
+        self.future = None
+        self.name = name
+        self.fastInterval = fastInterval
+        self.slowInterval = slowInterval
+        self.leadTime = leadTime
+        self.disarmEvent = threading.Event()
+        self.triggeredEvent = threading.Event()
+        self.callback = None
+        # device errors while polling go to errorHandler(error, handle) and polling goes on
+        self.deviceError = ()
+        self.errorHandler = None
+
+        # results of the last detection
+        self.armTime = None
+        self.triggerTime = None
+        self.latency = None
+        self.polls = 0
+
+        # delays between arming and triggering seen so far, used to pace the polling
+        self.delays = []
+
+    def arm(self, callback = None):
+        # starts watching, callback(triggerTime, latency) runs on the device I/O executor on
+        # detection. Each arming has a disarm event of its own, as disarm cannot wait for
+        # the previous watch to end when it is called from the engine's threads
+        self.disarm()
+        self.callback = callback
+        self.disarmEvent = threading.Event()
+        self.triggeredEvent.clear()
+        self.armTime = time.time()
+        self.polls = 0
+        self.future = self.engine.submit(self.watchAsync(self.disarmEvent, callback))
+
+    def setErrorHandler(self, deviceError, handler):
+        self.deviceError = deviceError
+        self.errorHandler = handler
+
+    def read(self, handle):
+        # the trigger line, None when it could not be read
+        try:
+            return application_helper.eReadName(handle, self.name)
+        except self.deviceError as error:
+            if not self.errorHandler == None:
+                self.errorHandler(error, handle)
+            return None
+
+    def disarm(self):
+        self.disarmEvent.set()
+        self.engine.wait(self.future)
+        self.future = None
+
+    def isArmed(self):
+        return not self.future == None and not self.disarmEvent.is_set() and not self.triggeredEvent.is_set()
+
+    def wait(self, timeout = None):
+        # blocks the calling thread until the trigger fires, returns False on timeout or disarm
+        while not self.triggeredEvent.wait(0.1 if timeout == None else timeout):
+            if self.disarmEvent.is_set() or not timeout == None:
+                return False
+        return True
+
+    def expectedDelay(self):
+        # median of the previous arm-to-trigger delays
+        if len(self.delays) == 0:
+            return None
+        ordered = sorted(self.delays)
+        return ordered[len(ordered)//2]
+
+    def pollInterval(self, waited):
+        # polls slowly until the trigger is due, then quickly
+        expected = self.expectedDelay()
+        if expected == None or waited >= expected - self.leadTime:
+            return self.fastInterval
+        return self.slowInterval
+
+    async def watchAsync(self, disarmed, callback):
+        # polls through the device I/O executor and sleeps on the event loop in between;
+        # disarmed is looked at after every wait, so a watch that has been disarmed
+        # or replaced never reports a detection
+        lastIdle = time.time()
+        while not disarmed.is_set():
+            result = await self.engine.io(self.read, self.handle)
+            if disarmed.is_set():
+                return
+            now = time.time()
+            if self.poll(result, now, lastIdle):
+                if not callback == None:
+                    await self.engine.io(self.fire, disarmed, callback, self.triggerTime, self.latency)
+                return
+            lastIdle = now
+            await asyncio.sleep(self.slowInterval if result == None else self.pollInterval(now - self.armTime))
+
+    def fire(self, disarmed, callback, triggerTime, latency):
+        # on the device I/O executor, after anything queued there before it such as a stop
+        if not disarmed.is_set():
+            callback(triggerTime, latency)
+
+    def poll(self, result, now, lastIdle):
+        # records a detection, returns True when the line was found low
+        self.polls += 1
+        if not result == 0:
+            return False
+        # the edge happened some time after the last poll that still saw the line high
+        self.triggerTime = now
+        self.latency = now - lastIdle
+        self.delays = (self.delays + [now - self.armTime])[-20:]
+        metrics.observe("trigger_wait_seconds", now - self.armTime)
+        metrics.observe("trigger_latency_seconds", self.latency)
+        metrics.count("trigger_polls", self.polls)
+        self.triggeredEvent.set()
+        return True